@@ -6,6 +6,12 @@ import random
 # ==============================================================================
 FILE_PATH = "C:\\Users\\Dang\\Documents\\Thesis\\The new Mmo\\src\\CS-9C.csv"
 VEHICLE_SPEED = 666.0  
+INSTANCE_CACHE_ENABLED = True  # Lưu/đọc instance đã tiền xử lý (.npz) cạnh file CSV
+# "dense": ma trận float64 đầy đủ trong RAM
+# "mmap_triangle": tam giác trên float32 trong file memory-mapped (instance rất lớn)
+# "matrix_free": chỉ lưu tọa độ, hàng khoảng cách tính khi cần và giữ trong LRU cache
+DISTANCE_STORAGE = "dense"
+DISTANCE_ROW_CACHE_SIZE = 2048  # Số hàng tối đa trong LRU cache (chế độ matrix_free)
 
 # ==============================================================================
 # 2. CẤU HÌNH GIAI ĐOẠN TẠO LỜI GIẢI BAN ĐẦU
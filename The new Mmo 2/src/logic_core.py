@@ -7,11 +7,36 @@ import functools
 import config
 from model_solution import SERouteData, FERouteData, SolutionData
 from model_problem import ProblemInstance, Customer
+from logic_schedule import (VECTORIZE_MIN_NODES, SETimeProfile, FEActivity, FESchedule, build_se_schedule_arrays,
+                            evaluate_se_schedule, calculate_se_time_profile)
 
 # ==============================================================================
 # CÁC HÀM TÍNH TOÁN CẤP THẤP (LOW-LEVEL CALCULATION FUNCTIONS)
 # ==============================================================================
 
+def _load_profile(loads: List[float]) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    """ Max tiền tố / hậu tố của tải sau mỗi vị trí trên SE route. """
+    prefix_max_load = tuple(itertools.accumulate(loads, max))
+    suffix_max_load = tuple(itertools.accumulate(reversed(loads), max))[::-1]
+    return prefix_max_load, suffix_max_load
+
+@functools.lru_cache(maxsize=4096)
+def calculate_se_load_profile(nodes_id: tuple[int, ...], problem: ProblemInstance) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    """ Profile tải của một chuỗi node (xe rời vệ tinh với toàn bộ hàng giao), không kiểm tra tải trọng. """
+    signed_demand = problem.signed_demand
+    load = -sum(signed_demand[cid] for cid in nodes_id[1:-1] if signed_demand[cid] < 0)
+    loads = [load]
+    for cid in nodes_id[1:-1]:
+        load += signed_demand[cid]
+        loads.append(load)
+    loads.append(load)
+    return _load_profile(loads)
+
+@functools.lru_cache(maxsize=4096)
+def calculate_se_route_time_profile(nodes_id: tuple[int, ...], problem: ProblemInstance) -> SETimeProfile:
+    """ Hồ sơ thời gian của SE route (xuất phát muộn nhất, thời điểm về theo thời điểm xuất phát), cache theo dãy node. """
+    return calculate_se_time_profile(problem, nodes_id)
+
 @functools.lru_cache(maxsize=4096)
 def calculate_se_route_properties(
     nodes_id: tuple[int, ...], 
@@ -28,22 +53,31 @@ def calculate_se_route_properties(
     total_load_delivery = 0.0
     total_load_pickup = 0.0
     
-    customers = [problem.node_objects[nid] for nid in nodes_id[1:-1]]
-    for cust in customers:
-        if cust.type == 'DeliveryCustomer':
-            total_load_delivery += cust.demand
+    base_id, signed_demand = problem.base_id, problem.signed_demand
+    ready_time, due_time, service_time = problem.ready_time, problem.due_time, problem.service_time
+    customer_ids = nodes_id[1:-1]
+    for cid in customer_ids:
+        if signed_demand[cid] < 0:
+            total_load_delivery -= signed_demand[cid]
         else:
-            total_load_pickup += cust.demand
+            total_load_pickup += signed_demand[cid]
 
     # --- Check SE Capacity ---
     running_load = total_load_delivery
     if running_load > problem.se_vehicle_capacity + 1e-6:
         return False, {}
-    for cust in customers:
-        if cust.type == 'DeliveryCustomer': running_load -= cust.demand
-        else: running_load += cust.demand
+    loads = [running_load]
+    for cid in customer_ids:
+        running_load += signed_demand[cid]
         if running_load < -1e-6 or running_load > problem.se_vehicle_capacity + 1e-6:
             return False, {}
+        loads.append(running_load)
+    loads.append(running_load)
+    prefix_max_load, suffix_max_load = _load_profile(loads)
+
+    if len(nodes_id) >= VECTORIZE_MIN_NODES:
+        return _calculate_se_schedule_vectorized(nodes_id, start_time, problem, total_load_pickup, total_load_delivery,
+                                                 prefix_max_load, suffix_max_load)
 
     # --- Tính toán lịch trình & dist/time ---
     service_start_times = {nodes_id[0]: start_time}
@@ -51,22 +85,20 @@ def calculate_se_route_properties(
 
     for i in range(len(nodes_id) - 1):
         prev_id, curr_id = nodes_id[i], nodes_id[i+1]
-        prev_obj = problem.node_objects[prev_id % problem.total_nodes]
-        curr_obj = problem.node_objects[curr_id % problem.total_nodes]
+        prev_base, curr_base = base_id[prev_id], base_id[curr_id]
 
-        dist = problem.get_distance(prev_obj.id, curr_obj.id)
-        tt = problem.get_travel_time(prev_obj.id, curr_obj.id)
+        dist = problem.get_distance(prev_base, curr_base)
+        tt = problem.get_travel_time(prev_base, curr_base)
         total_dist += dist
         total_travel_time += tt
 
-        st_prev = prev_obj.service_time if prev_obj.type != 'Satellite' else 0.0
-        departure_prev = service_start_times[prev_id] + st_prev
+        departure_prev = service_start_times[prev_id] + service_time[prev_base]
         arrival_curr = departure_prev + tt
         
-        start_service = max(arrival_curr, getattr(curr_obj, 'ready_time', 0))
+        start_service = max(arrival_curr, ready_time[curr_base])
         
         # --- Check Time Window ---
-        if start_service > getattr(curr_obj, 'due_time', float('inf')) + 1e-6:
+        if start_service > due_time[curr_base] + 1e-6:
             return False, {}
             
         service_start_times[curr_id] = start_service
@@ -76,22 +108,33 @@ def calculate_se_route_properties(
     forward_time_slacks = {nodes_id[-1]: float('inf')}
     for i in range(len(nodes_id) - 2, -1, -1):
         node_id, succ_id = nodes_id[i], nodes_id[i+1]
-        node_obj = problem.node_objects[node_id % problem.total_nodes]
-        due_time = getattr(node_obj, 'due_time', float('inf'))
-        st_node = node_obj.service_time if node_obj.type != 'Satellite' else 0.0
-        
-        departure_node = service_start_times[node_id] + st_node
-        arrival_succ = service_start_times[succ_id] - waiting_times[succ_id]
-        slack_between = arrival_succ - departure_node
-        
-        slack = min(forward_time_slacks[succ_id] + slack_between, due_time - service_start_times[node_id])
+        # Savelsbergh: độ trễ tại node được thời gian chờ ở node kế tiếp hấp thụ một phần
+        slack = min(forward_time_slacks[succ_id] + waiting_times[succ_id], due_time[base_id[node_id]] - service_start_times[node_id])
         forward_time_slacks[node_id] = slack
 
     return True, {
         "total_dist": total_dist, "total_travel_time": total_travel_time,
         "total_load_pickup": total_load_pickup, "total_load_delivery": total_load_delivery,
         "service_start_times": service_start_times, "waiting_times": waiting_times,
-        "forward_time_slacks": forward_time_slacks
+        "forward_time_slacks": forward_time_slacks,
+        "prefix_max_load": prefix_max_load, "suffix_max_load": suffix_max_load
+    }
+
+def _calculate_se_schedule_vectorized(nodes_id, start_time, problem, total_load_pickup, total_load_delivery,
+                                      prefix_max_load, suffix_max_load) -> Tuple[bool, Dict]:
+    """ Phần lịch trình của calculate_se_route_properties cho route dài, tính bằng phép quét max-plus (logic_schedule). """
+    result = evaluate_se_schedule(build_se_schedule_arrays(problem, nodes_id), start_time)
+    if not result.feasible:
+        return False, {}
+    base = problem.node_arrays['base_id'][list(nodes_id)]
+    return True, {
+        "total_dist": float(problem.get_distances(base[:-1], base[1:]).sum()),
+        "total_travel_time": float(problem.get_travel_times(base[:-1], base[1:]).sum()),
+        "total_load_pickup": total_load_pickup, "total_load_delivery": total_load_delivery,
+        "service_start_times": dict(zip(nodes_id, result.start_times.tolist())),
+        "waiting_times": dict(zip(nodes_id, result.waiting_times.tolist())),
+        "forward_time_slacks": dict(zip(nodes_id, result.forward_slacks.tolist())),
+        "prefix_max_load": prefix_max_load, "suffix_max_load": suffix_max_load
     }
 
 
@@ -104,7 +147,7 @@ def check_and_calculate_fe_schedule(
     Trả về (is_feasible, fe_properties_dict).
     """
     if not serviced_se_routes:
-        return True, {"schedule": tuple(), "total_dist": 0.0, "total_time": 0.0, 
+        return True, {"schedule": FESchedule(), "total_dist": 0.0, "total_time": 0.0, 
                        "total_travel_time": 0.0, "route_deadline": float('inf')}
 
     depot = problem.depot
@@ -113,51 +156,42 @@ def check_and_calculate_fe_schedule(
     if initial_delivery_load > problem.fe_vehicle_capacity + 1e-6:
         return False, None
 
-    sats_to_visit = {problem.node_objects[se.satellite_id] for se in serviced_se_routes}
-    sats_list = sorted(list(sats_to_visit), key=lambda s: problem.get_distance(depot.id, s.id))
+    # Nhóm SE route theo vệ tinh trong một lượt, O(số SE route)
+    se_routes_by_satellite = {}
+    for se in serviced_se_routes:
+        se_routes_by_satellite.setdefault(se.satellite_id, []).append(se)
+    # Thứ tự ghé vệ tinh và chi phí FE chỉ phụ thuộc tập vệ tinh: tra bảng theo bitmask
+    fe_tour = problem.get_fe_tour(problem.satellite_mask(se_routes_by_satellite))
+    sats_list = fe_tour.satellites
     
-    schedule = []
+    # Lịch dạng cột, điền theo dòng; không sửa sau khi trả về (FERouteData bất biến)
+    schedule = FESchedule()
     current_time = 0.0
     current_load = initial_delivery_load
     
-    schedule.append({'activity': 'DEPART_DEPOT', 'node_id': depot.id, 'load_change': current_load, 
-                     'load_after': current_load, 'arrival_time': 0.0, 'start_svc_time': 0.0, 'departure_time': 0.0})
+    schedule.put(0, FEActivity.DEPART_DEPOT, depot.id, current_load, current_load, 0.0, 0.0, 0.0)
     
     last_node_id = depot.id
-    route_deadlines = set()
+    effective_deadline = float('inf')
 
     for satellite in sats_list:
         arrival_at_sat = current_time + problem.get_travel_time(last_node_id, satellite.id)
         
-        se_routes_at_sat = [r for r in serviced_se_routes if r.satellite_id == satellite.id]
+        se_routes_at_sat = se_routes_by_satellite[satellite.id]
         del_load_at_sat = sum(r.total_load_delivery for r in se_routes_at_sat)
         
         current_load -= del_load_at_sat
-        schedule.append({'activity': 'UNLOAD_DELIV', 'node_id': satellite.id, 'load_change': -del_load_at_sat, 
-                         'load_after': current_load, 'arrival_time': arrival_at_sat, 
-                         'start_svc_time': arrival_at_sat, 'departure_time': arrival_at_sat})
+        schedule.put(len(schedule), FEActivity.UNLOAD_DELIV, satellite.id, -del_load_at_sat, current_load,
+                     arrival_at_sat, arrival_at_sat, arrival_at_sat)
         
         latest_se_finish = 0
         for se_route_data in se_routes_at_sat:
-            # DOWNSTREAM SYNC: Tính toán lại SE route với thời gian bắt đầu mới
-            is_se_feasible, _ = calculate_se_route_properties(
-                se_route_data.nodes_id, se_route_data.satellite_id, arrival_at_sat, problem
-            )
-            if not is_se_feasible:
+            # DOWNSTREAM SYNC: khả thi và thời điểm về vệ tinh tra từ hồ sơ thời gian của SE, O(1)
+            profile = calculate_se_route_time_profile(se_route_data.nodes_id, problem)
+            if not profile.is_feasible_start(arrival_at_sat):
                 return False, None
-
-            # Tính toán lại lịch trình chi tiết để lấy deadline và thời gian kết thúc
-            # (tối ưu: calculate_se_route_properties có thể trả về luôn các giá trị này)
-            temp_se_sched_is_ok, temp_se_props = calculate_se_route_properties(
-                se_route_data.nodes_id, se_route_data.satellite_id, arrival_at_sat, problem
-            )
-            
-            for cust_id in se_route_data.nodes_id[1:-1]:
-                cust = problem.node_objects[cust_id]
-                if hasattr(cust, 'deadline'):
-                    route_deadlines.add(cust.deadline)
-            
-            latest_se_finish = max(latest_se_finish, temp_se_props['service_start_times'][se_route_data.nodes_id[-1]])
+            effective_deadline = min(effective_deadline, profile.route_deadline)
+            latest_se_finish = max(latest_se_finish, profile.finish_time(arrival_at_sat))
         
         pickup_load_at_sat = sum(r.total_load_pickup for r in se_routes_at_sat)
         departure_from_sat = latest_se_finish
@@ -166,31 +200,25 @@ def check_and_calculate_fe_schedule(
         if current_load > problem.fe_vehicle_capacity + 1e-6:
              return False, None
              
-        schedule.append({'activity': 'LOAD_PICKUP', 'node_id': satellite.id, 'load_change': pickup_load_at_sat, 
-                         'load_after': current_load, 'arrival_time': latest_se_finish, 
-                         'start_svc_time': latest_se_finish, 'departure_time': departure_from_sat})
+        schedule.put(len(schedule), FEActivity.LOAD_PICKUP, satellite.id, pickup_load_at_sat, current_load,
+                     latest_se_finish, latest_se_finish, departure_from_sat)
         
         current_time = departure_from_sat
         last_node_id = satellite.id
 
     arrival_at_depot = current_time + problem.get_travel_time(last_node_id, depot.id)
-    schedule.append({'activity': 'ARRIVE_DEPOT', 'node_id': depot.id, 'load_change': -current_load, 
-                     'load_after': 0, 'arrival_time': arrival_at_depot, 
-                     'start_svc_time': arrival_at_depot, 'departure_time': arrival_at_depot})
+    schedule.put(len(schedule), FEActivity.ARRIVE_DEPOT, depot.id, -current_load, 0,
+                 arrival_at_depot, arrival_at_depot, arrival_at_depot)
     
-    effective_deadline = min(route_deadlines) if route_deadlines else float('inf')
     if arrival_at_depot > effective_deadline + 1e-6:
         return False, None
     
     # Tính các thuộc tính cuối cùng của FE route
-    path_nodes = [schedule[0]['node_id']]
-    [path_nodes.append(e['node_id']) for e in schedule[1:] if e['node_id'] != path_nodes[-1]]
-    total_dist = sum(problem.get_distance(path_nodes[i], path_nodes[i+1]) for i in range(len(path_nodes) - 1))
-    total_travel_time = sum(problem.get_travel_time(path_nodes[i], path_nodes[i+1]) for i in range(len(path_nodes) - 1))
-    total_time = schedule[-1]['arrival_time'] - schedule[0]['departure_time']
+    total_dist, total_travel_time = fe_tour.total_dist, fe_tour.total_travel_time
+    total_time = schedule.arrival_time[-1] - schedule.departure_time[0]
     
     return True, {
-        "schedule": tuple(schedule), "total_dist": total_dist, "total_time": total_time,
+        "schedule": schedule, "total_dist": total_dist, "total_time": total_time,
         "total_travel_time": total_travel_time, "route_deadline": effective_deadline
     }
 
@@ -199,29 +227,41 @@ def check_and_calculate_fe_schedule(
 # ==============================================================================
 
 def find_feasible_insertions_for_se(
-    current_nodes: tuple[int, ...], 
+    se_route: SERouteData, 
     customer: Customer,
     problem: ProblemInstance
 ) -> List[Dict]:
-    """ Tìm tất cả các vị trí chèn hợp lệ cho một khách hàng vào một chuỗi node. """
+    """ Tìm tất cả các vị trí chèn hợp lệ cho một khách hàng vào một SE route. """
     feasible_options = []
+    current_nodes = se_route.nodes_id
+    prefix_max_load, suffix_max_load = se_route.prefix_max_load, se_route.suffix_max_load
+    if len(prefix_max_load) != len(current_nodes):
+        # SERouteData tạm (thuộc tính chưa được tính lại): dựng profile tải từ nodes_id
+        prefix_max_load, suffix_max_load = calculate_se_load_profile(current_nodes, problem)
+    is_delivery = problem.is_delivery[customer.id]
+    load_limit = problem.se_vehicle_capacity + 1e-6 - customer.demand
+    tw_successors = problem.tw_successors
+    cust_successors, cust_byte, cust_bit = tw_successors[customer.id], customer.id >> 3, customer.id & 7
     # Tái sử dụng logic từ InsertionProcessor nhưng ở dạng hàm
     for i in range(len(current_nodes) - 1):
         pos_to_insert = i + 1
+        # Tải trọng, O(1): hàng giao làm tăng tải ở các vị trí <= i, hàng lấy làm tăng tải từ vị trí i trở đi
+        if is_delivery:
+            if prefix_max_load[i] > load_limit: break
+        elif suffix_max_load[i] > load_limit:
+            continue
+        prev_id, next_id = problem.base_id[current_nodes[pos_to_insert - 1]], problem.base_id[current_nodes[pos_to_insert]]
+        # Bỏ qua ngay bộ ba (prev, customer, next) không thể thỏa time window
+        if not (tw_successors[prev_id][cust_byte] >> cust_bit & 1 and cust_successors[next_id >> 3] >> (next_id & 7) & 1):
+            continue
         temp_nodes_id = current_nodes[:pos_to_insert] + (customer.id,) + current_nodes[pos_to_insert:]
         
-        # Chỉ cần kiểm tra tính khả thi về tải trọng ở đây
+        # Tải trọng đã kiểm tra ở trên; đây chỉ còn lọc time window khi xuất phát lúc 0
         # Các ràng buộc về thời gian sẽ được kiểm tra toàn cục sau
-        is_feasible, _ = calculate_se_route_properties(temp_nodes_id, 0, 0.0, problem) # satellite_id, start_time không quan trọng
-        if is_feasible:
-            prev_node_id = current_nodes[pos_to_insert - 1]
-            next_node_id = current_nodes[pos_to_insert]
-            prev_obj = problem.node_objects[prev_node_id % problem.total_nodes]
-            next_obj = problem.node_objects[next_node_id % problem.total_nodes]
-            
-            dist_increase = (problem.get_distance(prev_obj.id, customer.id) + 
-                             problem.get_distance(customer.id, next_obj.id) - 
-                             problem.get_distance(prev_obj.id, next_obj.id))
+        if calculate_se_route_time_profile(temp_nodes_id, problem).is_feasible_start(0.0):
+            dist_increase = (problem.get_distance(prev_id, customer.id) + 
+                             problem.get_distance(customer.id, next_id) - 
+                             problem.get_distance(prev_id, next_id))
             
             feasible_options.append({"pos": pos_to_insert, "dist_increase": dist_increase})
             
@@ -251,7 +291,7 @@ def find_best_insertion_for_customer(
                 break
         if fe_idx_hosting_se == -1: continue
 
-        local_insertions = find_feasible_insertions_for_se(se_route.nodes_id, customer, problem)
+        local_insertions = find_feasible_insertions_for_se(se_route, customer, problem)
         
         for local_opt in local_insertions:
             # 1. Tạo SE route mới (thử nghiệm)
@@ -283,15 +323,16 @@ def find_best_insertion_for_customer(
     # --- Lựa chọn 2 & 3: Tạo SE route mới ---
     candidate_satellites = problem.satellite_neighbors.get(customer.id, problem.satellites)
     for satellite in candidate_satellites:
+        if satellite.id not in problem.reachable_satellite_ids[customer.id]: continue
         new_se_nodes = (satellite.dist_id, customer.id, satellite.coll_id)
-        is_se_feasible, se_props = calculate_se_route_properties(new_se_nodes, satellite.id, 0.0, problem)
-        if not is_se_feasible: continue
+        # SE mới một khách hàng (và FE riêng cho nó) chỉ phụ thuộc cặp (khách hàng, vệ tinh): tra bảng tính sẵn
+        singleton = problem.get_singleton_route(customer.id, satellite.id)
+        if not singleton.se_feasible: continue
         
         # 2. Thử tạo FE route mới
-        is_fe_feasible, fe_props = check_and_calculate_fe_schedule([SERouteData(satellite.id, new_se_nodes, **se_props)], problem)
-        if is_fe_feasible:
+        if singleton.new_fe_feasible and singleton.total_load_pickup <= problem.fe_vehicle_capacity + 1e-6:
             # Tính chi phí tăng thêm
-            increase = (config.WEIGHT_PRIMARY * (se_props['total_travel_time'] + fe_props['total_travel_time']))
+            increase = (config.WEIGHT_PRIMARY * (singleton.total_travel_time + singleton.new_fe_travel_time))
             if config.OPTIMIZE_VEHICLE_COUNT:
                 increase += config.WEIGHT_SE_VEHICLE + config.WEIGHT_FE_VEHICLE
             
@@ -299,9 +340,10 @@ def find_best_insertion_for_customer(
                 best_option = {'objective_increase': increase, 'type': 'create_new_se_new_fe', 'new_satellite_id': satellite.id}
         
         # 3. Thử chèn vào FE route có sẵn
+        new_se_for_test = SERouteData(satellite.id, new_se_nodes, singleton.total_dist, singleton.total_travel_time,
+                                      singleton.total_load_pickup, singleton.total_load_delivery, {}, {}, {})
         for fe_idx, fe_route in enumerate(solution_data.fe_routes):
             current_se_routes = [solution_data.se_routes[i] for i in fe_route.serviced_se_route_indices]
-            new_se_for_test = SERouteData(satellite.id, new_se_nodes, **se_props)
             
             is_feasible_expand, _ = check_and_calculate_fe_schedule(current_se_routes + [new_se_for_test], problem)
             if is_feasible_expand:
@@ -100,6 +100,8 @@ def main():
     # Sử dụng các hàm tiện ích hỗ trợ SolutionData (DOP)
     print_solution_details_dop(final_solution_data, execution_time=end_time - start_time)
     validate_solution_feasibility_dop(final_solution_data)
+    if config.DISTANCE_STORAGE == "matrix_free":
+        print(f"Distance row cache: {problem.distances.cache_info()}")
     
     print("\nGenerating plots...")
     plot_solution_visualization_dop(final_solution_data, save_dir=run_dir)
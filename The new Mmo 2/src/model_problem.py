@@ -1,7 +1,60 @@
 # model_problem.py
-import pandas as pd
-import math
+import csv
+import hashlib
+import io
+import os
+import zipfile
+from array import array
+from collections import OrderedDict, namedtuple
+import numpy as np
+from collections.abc import Mapping
 import config
+from model_spatial import SpatialGrid
+from logic_schedule import SETimeProfile
+
+_CACHE_VERSION = 5
+# Tên mảng trong cache -> tên cột trong CSV
+_CSV_COLUMNS = {
+    'x': 'X', 'y': 'Y', 'service_time': 'Service Time', 'early': 'Early',
+    'latest': 'Latest', 'demand': 'Demand', 'deadline': 'Deadline',
+}
+_COLUMN_KEYS = ('type', *_CSV_COLUMNS, 'fe_cap', 'se_cap')
+# Các thuộc tính chỉ được dựng (từ các mảng cột) khi có code truy cập tới
+_LAZY_NODE_ATTRS = ('depot', 'satellites', 'customers', 'node_objects')
+
+def _parse_float(value: str) -> float:
+    value = value.strip()
+    return float(value) if value else float('nan')
+
+def read_instance_columns(csv_text: str) -> dict:
+    """
+    Đọc CSV theo luồng bằng module csv, điền thẳng vào các mảng cột có kiểu.
+    Ô trống -> NaN; Type trống -> -1 (bỏ qua khi dựng node).
+    """
+    reader = csv.reader(io.StringIO(csv_text))
+    header = [name.strip() for name in next(reader)]
+    type_col = header.index('Type')
+    float_cols = [(header.index(csv_name), array('d')) for csv_name in _CSV_COLUMNS.values()]
+    fe_cap_col, se_cap_col = header.index('FE Cap'), header.index('SE Cap')
+    
+    types = array('b')
+    fe_cap = se_cap = None
+    for row in reader:
+        if not row: continue
+        if len(row) < len(header):
+            row += [''] * (len(header) - len(row))
+        node_type = row[type_col].strip()
+        types.append(int(float(node_type)) if node_type else -1)
+        for col, values in float_cols:
+            values.append(_parse_float(row[col]))
+        if fe_cap is None:
+            fe_cap, se_cap = _parse_float(row[fe_cap_col]), _parse_float(row[se_cap_col])
+    
+    columns = {name: np.frombuffer(values, dtype=np.float64) for name, (col, values) in zip(_CSV_COLUMNS, float_cols)}
+    columns['type'] = np.frombuffer(types, dtype=np.int8)
+    columns['fe_cap'] = np.float64(fe_cap)
+    columns['se_cap'] = np.float64(se_cap)
+    return columns
 
 class Node:
     def __init__(self, node_id, x, y):
@@ -30,6 +83,21 @@ class Customer(Node):
         self.ready_time = float(et)
         self.due_time = float(lt)
 
+class SingletonRoute:
+    """
+    SE route một khách hàng (vệ tinh -> khách hàng -> vệ tinh) và FE route riêng chỉ phục vụ nó (kho -> vệ tinh -> kho).
+    Chỉ phụ thuộc cặp (khách hàng, vệ tinh) nên được tính sẵn một lần (ProblemInstance.get_singleton_route).
+    Bất biến; có các thuộc tính mà phép dò đồng bộ FE chỉ-đọc cần (satellite, tải, time_profile) nên dùng thay
+    SE route khi thử mở rộng một FE route có sẵn. Không gắn vào FE route thật: khi chèn thì dựng SERoute.
+    """
+    __slots__ = ('customer_id', 'satellite', 'total_dist', 'total_travel_time', 'total_load_pickup', 'total_load_delivery',
+                 'time_profile', 'se_feasible', 'new_fe_feasible', 'new_fe_dist', 'new_fe_travel_time')
+
+    def __init__(self, **fields):
+        for name, value in fields.items(): setattr(self, name, value)
+
+FETour = namedtuple('FETour', ['satellites', 'total_dist', 'total_travel_time'])
+
 class DeliveryCustomer(Customer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -41,93 +109,569 @@ class PickupCustomer(Customer):
         self.type = 'PickupCustomer'
         self.deadline = float(deadline)
 
+# ==============================================================================
+# DISTANCE STORAGE (config.DISTANCE_STORAGE)
+# ==============================================================================
+
+class _DenseDistanceStore:
+    """ Ma trận khoảng cách & thời gian di chuyển đầy đủ (float64) trong RAM. """
+    def __init__(self, matrix, vehicle_speed):
+        self.matrix = matrix
+        if vehicle_speed > 0:
+            self.time_matrix = matrix / vehicle_speed
+        else:
+            self.time_matrix = np.full_like(matrix, float('inf'))
+        # ndarray.item trả về float Python, nhanh hơn indexing thường cho truy vấn đơn lẻ
+        self.item = matrix.item
+        self.time_item = self.time_matrix.item
+
+    @staticmethod
+    def compute(coords):
+        dx = coords[:, 0, None] - coords[None, :, 0]
+        dy = coords[:, 1, None] - coords[None, :, 1]
+        dist = dx * dx
+        dist += dy * dy
+        np.sqrt(dist, out=dist)
+        return dist
+
+    def take(self, rows, cols): return self.matrix[rows, cols]
+    def take_time(self, rows, cols): return self.time_matrix[rows, cols]
+    def max(self): return float(self.matrix.max()) if self.matrix.size else 0.0
+
+
+class _TriangularDistanceStore:
+    """
+    Chỉ lưu tam giác trên (bỏ đường chéo) dạng float32 trong file memory-mapped.
+    File mở read-only nên nhiều tiến trình solver dùng chung qua page cache của OS.
+    """
+    def __init__(self, path, size, vehicle_speed):
+        self.size = size
+        self.vehicle_speed = vehicle_speed
+        self.tri = np.memmap(path, dtype=np.float32, mode='r', shape=(self.packed_length(size),))
+        self._tri_item = self.tri.item
+
+    @staticmethod
+    def packed_length(size): return max(size * (size - 1) // 2, 1)
+
+    @classmethod
+    def build(cls, path, coords):
+        """ Ghi tam giác trên theo từng hàng, không bao giờ dựng ma trận n x n trong RAM. """
+        n = len(coords)
+        x, y = coords[:, 0], coords[:, 1]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        tri = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=(cls.packed_length(n),))
+        offset = 0
+        for i in range(n - 1):
+            dx = x[i + 1:] - x[i]
+            dy = y[i + 1:] - y[i]
+            tri[offset:offset + n - i - 1] = np.sqrt(dx * dx + dy * dy)
+            offset += n - i - 1
+        tri.flush()
+        del tri
+        os.replace(tmp_path, path)
+
+    def item(self, i, j):
+        if i == j: return 0.0
+        if i > j: i, j = j, i
+        if j >= self.size: raise IndexError(j)
+        return self._tri_item(i * (2 * self.size - i - 1) // 2 + j - i - 1)
+
+    def time_item(self, i, j):
+        return self.item(i, j) / self.vehicle_speed if self.vehicle_speed > 0 else float('inf')
+
+    def take(self, rows, cols):
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))
+        i, j = np.minimum(rows, cols), np.maximum(rows, cols)
+        on_diag = i == j
+        idx = np.where(on_diag, 0, i * (2 * self.size - i - 1) // 2 + j - i - 1)
+        return np.where(on_diag, 0.0, self.tri[idx].astype(np.float64))
+
+    def take_time(self, rows, cols):
+        if self.vehicle_speed <= 0:
+            return np.full(np.broadcast(rows, cols).shape, float('inf'))
+        return self.take(rows, cols) / self.vehicle_speed
+
+    def max(self): return float(self.tri.max()) if self.size > 1 else 0.0
+
+
+RowCacheInfo = namedtuple('RowCacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class _CoordinateDistanceStore:
+    """
+    Không lưu ma trận: khoảng cách Euclid được tính từ tọa độ khi cần.
+    Truy vấn đơn lẻ lấy từ các hàng khoảng cách đã tính, giữ trong một LRU cache có giới hạn.
+    """
+    def __init__(self, coords, vehicle_speed, max_rows):
+        self.x = np.ascontiguousarray(coords[:, 0])
+        self.y = np.ascontiguousarray(coords[:, 1])
+        self.vehicle_speed = vehicle_speed
+        self.max_rows = max(int(max_rows), 1)
+        self._rows = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def row(self, i):
+        row = self._rows.get(i)
+        if row is not None:
+            self._rows.move_to_end(i)
+            self.hits += 1
+            return row
+        self.misses += 1
+        dx = self.x - self.x[i]
+        dy = self.y - self.y[i]
+        row = np.sqrt(dx * dx + dy * dy)
+        self._rows[i] = row
+        if len(self._rows) > self.max_rows:
+            self._rows.popitem(last=False)
+        return row
+
+    def item(self, i, j):
+        # Khoảng cách đối xứng: dùng hàng j nếu nó đã nằm trong cache
+        if i not in self._rows and j in self._rows:
+            i, j = j, i
+        return self.row(i).item(j)
+
+    def time_item(self, i, j):
+        return self.item(i, j) / self.vehicle_speed if self.vehicle_speed > 0 else float('inf')
+
+    def take(self, rows, cols):
+        dx = self.x[rows] - self.x[cols]
+        dy = self.y[rows] - self.y[cols]
+        return np.sqrt(dx * dx + dy * dy)
+
+    def take_time(self, rows, cols):
+        if self.vehicle_speed <= 0:
+            return np.full(np.broadcast(rows, cols).shape, float('inf'))
+        return self.take(rows, cols) / self.vehicle_speed
+
+    def max(self, chunk_size=1024):
+        best = 0.0
+        idx = np.arange(len(self.x))
+        for start in range(0, len(idx), chunk_size):
+            block = self.take(idx[start:start + chunk_size, None], idx[None, :])
+            if block.size: best = max(best, float(block.max()))
+        return best
+
+    def cache_info(self) -> RowCacheInfo:
+        return RowCacheInfo(self.hits, self.misses, self.max_rows, len(self._rows))
+
+    def cache_clear(self):
+        self._rows.clear()
+        self.hits = self.misses = 0
+
+
+class _DistanceMatrixView(Mapping):
+    """ Shim dict-of-dicts cũ (dist_matrix[n1][n2]) đọc qua kho khoảng cách. """
+    def __init__(self, store, node_ids):
+        self._store = store
+        self._node_ids = list(node_ids)
+
+    def __getitem__(self, n1):
+        if n1 not in self._node_ids: raise KeyError(n1)
+        return dict(zip(self._node_ids, self._store.take(n1, self._node_ids).tolist()))
+
+    def __iter__(self): return iter(self._node_ids)
+    def __len__(self): return len(self._node_ids)
+
+class _NeighborView(Mapping):
+    """ View {customer_id: [node objects]} dựng theo yêu cầu từ bảng chỉ số láng giềng. """
+    def __init__(self, neighbor_ids, row_of, problem):
+        self._neighbor_ids = neighbor_ids
+        self._row_of = row_of
+        self._problem = problem
+
+    def __getitem__(self, cust_id):
+        node_objects = self._problem.node_objects
+        return [node_objects[nid] for nid in self._neighbor_ids[self._row_of[cust_id]].tolist()]
+
+    def __iter__(self): return iter(self._row_of)
+    def __len__(self): return len(self._row_of)
+
 class ProblemInstance:
     def __init__(self, file_path, vehicle_speed=1.0):
-        df = pd.read_csv(file_path)
-        df.columns = df.columns.str.strip()
+        self.file_path = file_path
+        self.vehicle_speed = vehicle_speed
+        
+        with open(file_path, 'rb') as f:
+            csv_bytes = f.read()
+        self._cache_stem = self._cache_stem_for(file_path, csv_bytes, vehicle_speed)
+        cache_path = f"{self._cache_stem}.npz" if config.INSTANCE_CACHE_ENABLED else None
+        cached = self._load_cache(cache_path) if cache_path else None
+        
+        if cached is not None:
+            self.columns = {name: cached[name] for name in _COLUMN_KEYS}
+        else:
+            self.columns = read_instance_columns(csv_bytes.decode('utf-8-sig'))
+        self._index_nodes()
+        
+        if cached is not None:
+            print(f"\nLoaded pre-processed instance from cache: {os.path.basename(cache_path)}")
+            self._init_distance_store(cached.get('distance_matrix'))
+            self._max_dist = float(cached['max_dist'])
+            self.customer_neighbor_ids = cached['customer_neighbor_ids']
+            self.satellite_neighbor_ids = cached['satellite_neighbor_ids']
+            self._build_neighbor_views()
+            self._precompute_reachability()
+            self._precompute_singleton_routes()
+            self._set_tw_compatibility(cached['tw_compatible'])
+        else:
+            self._init_distance_store()
+            self._max_dist = self.distances.max()
+            print("\nPre-processing for pruning candidate lists...")
+            self._precompute_neighbors()
+            self._precompute_reachability()
+            self._precompute_singleton_routes()
+            self._precompute_tw_compatibility()
+            print("Pre-processing complete.")
+            if cache_path:
+                self._save_cache(cache_path)
+
+    def __getattr__(self, name):
+        # Chỉ được gọi khi thuộc tính chưa tồn tại: dựng node objects lần đầu có code cần đến
+        if name in _LAZY_NODE_ATTRS and '_node_ids' in self.__dict__:
+            self._build_nodes()
+            return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __deepcopy__(self, memo):
+        # Dữ liệu bài toán chỉ đọc: các bản sao lời giải dùng chung một instance
+        return self
+
+    def _index_nodes(self):
+        """ Các chỉ số cần cho tiền xử lý, tính thẳng từ mảng cột (không cần node objects). """
+        columns = self.columns
+        node_type = columns['type']
+        customer_mask = (node_type == 2) | (node_type == 3)
+        self._node_ids = np.flatnonzero((node_type >= 0) & (node_type <= 3))
+        self.total_nodes = len(self._node_ids)
+        self.customer_ids = np.flatnonzero(customer_mask).astype(np.int32)
+        self.satellite_ids = np.flatnonzero(node_type == 1).astype(np.int32)
+        self.customer_index = {cust_id: row for row, cust_id in enumerate(self.customer_ids.tolist())}
+        self.satellite_index = {sat_id: col for col, sat_id in enumerate(self.satellite_ids.tolist())}
+        self._fe_tours = {}
+        
+        self.coords = np.column_stack((columns['x'], columns['y']))
+        # Chỉ mục không gian cho truy vấn láng giềng / quét theo vòng quanh một khách hàng
+        self.customer_grid = SpatialGrid(self.coords, self.customer_ids)
+        self.satellite_grid = SpatialGrid(self.coords, self.satellite_ids)
+        self.fe_vehicle_capacity = float(columns['fe_cap'])
+        self.se_vehicle_capacity = float(columns['se_cap'])
+        
+        self._max_due_time = 0.0
+        self._max_demand = 0.0
+        if customer_mask.any():
+            # NaN bị bỏ qua giống phép so sánh '>' trong vòng lặp cũ
+            self._max_due_time = float(np.nanmax(columns['latest'][customer_mask], initial=0.0))
+            self._max_demand = float(np.nanmax(columns['demand'][customer_mask], initial=0.0))
         
+        self._build_node_attributes()
+
+    def _build_node_attributes(self):
+        """
+        Thuộc tính node dạng struct-of-arrays, đánh chỉ số theo node id (gồm cả alias coll_id của vệ tinh).
+        node_arrays giữ bản NumPy cho tính toán vector hóa; các list cùng tên trên instance
+        dùng cho vòng lặp Python (index list nhanh hơn index ndarray từng phần tử).
+        """
+        columns = self.columns
+        node_type = columns['type']
+        n_rows = len(node_type)
+        ids = np.arange(n_rows + self.total_nodes)
+        base_id = np.where(ids < n_rows, ids, ids - self.total_nodes)
+        base_type = node_type[base_id]
+        is_customer = (base_type == 2) | (base_type == 3)
+        is_delivery = base_type == 2
+        demand = np.where(is_customer, columns['demand'][base_id], 0.0)
+        
+        self.node_arrays = {
+            'base_id': base_id,
+            'is_delivery': is_delivery,
+            'signed_demand': np.where(is_delivery, -demand, demand),
+            'ready_time': np.where(is_customer, columns['early'][base_id], 0.0),
+            'due_time': np.where(is_customer, columns['latest'][base_id], np.inf),
+            'service_time': np.where(is_customer, columns['service_time'][base_id], 0.0),
+            'deadline': np.where(base_type == 3, columns['deadline'][base_id], np.inf),
+        }
+        for name, values in self.node_arrays.items():
+            setattr(self, name, values.tolist())
+
+    def _build_nodes(self):
+        columns = self.columns
         self.depot = None
         self.satellites = []
         self.customers = []
         node_objects = {}
         
-        for i, row in df.iterrows():
+        rows = zip(columns['type'].tolist(), *(columns[name].tolist() for name in _CSV_COLUMNS))
+        for i, (node_type, x, y, st, et, lt, d, dl) in enumerate(rows):
             node = None
-            if row['Type'] == 0:
-                node = Depot(i, row['X'], row['Y'])
+            if node_type == 0:
+                node = Depot(i, x, y)
                 self.depot = node
-            elif row['Type'] == 1:
-                node = Satellite(i, row['X'], row['Y'], row['Service Time'])
+            elif node_type == 1:
+                node = Satellite(i, x, y, st)
                 self.satellites.append(node)
-            elif row['Type'] == 2:
-                node = DeliveryCustomer(i, row['X'], row['Y'], row['Demand'], row['Service Time'], row['Early'], row['Latest'])
+            elif node_type == 2:
+                node = DeliveryCustomer(i, x, y, d, st, et, lt)
                 self.customers.append(node)
-            elif row['Type'] == 3:
-                node = PickupCustomer(i, row['X'], row['Y'], row['Demand'], row['Service Time'], row['Early'], row['Latest'], row['Deadline'])
+            elif node_type == 3:
+                node = PickupCustomer(i, x, y, d, st, et, lt, dl)
                 self.customers.append(node)
             
             if node:
                 node_objects[i] = node
         
         self.node_objects = node_objects
-        self.total_nodes = len(node_objects)
-        
         for sat in self.satellites:
             sat.coll_id = sat.id + self.total_nodes
+
+    # --- Binary cache (.npz cạnh file CSV) ---
+    @staticmethod
+    def _cache_stem_for(file_path, csv_bytes, vehicle_speed):
+        """ Khóa cache = hash nội dung CSV + VEHICLE_SPEED + các tham số PRUNING_* + kiểu lưu khoảng cách. """
+        pruning = sorted((name, getattr(config, name)) for name in dir(config) if name.startswith('PRUNING_'))
+        digest = hashlib.sha256(csv_bytes)
+        digest.update(repr((_CACHE_VERSION, float(vehicle_speed), pruning, config.DISTANCE_STORAGE)).encode())
+        stem = os.path.splitext(file_path)[0]
+        return f"{stem}.{digest.hexdigest()[:16]}"
+
+    @staticmethod
+    def _load_cache(cache_path):
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Warning: ignoring unreadable instance cache {cache_path}: {e}")
+            return None
+
+    def _save_cache(self, cache_path):
+        arrays = dict(self.columns)
+        if self.distance_matrix is not None:
+            arrays['distance_matrix'] = self.distance_matrix
+        arrays['max_dist'] = np.float64(self._max_dist)
+        arrays['customer_neighbor_ids'] = self.customer_neighbor_ids
+        arrays['satellite_neighbor_ids'] = self.satellite_neighbor_ids
+        arrays['tw_compatible'] = self.tw_compatible
+        # Ghi ra file tạm rồi os.replace để các tiến trình chạy song song không đọc phải file dở dang
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Warning: could not write instance cache {cache_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _init_distance_store(self, dense_matrix=None):
+        storage = config.DISTANCE_STORAGE
+        if storage == "dense":
+            if dense_matrix is None:
+                dense_matrix = _DenseDistanceStore.compute(self.coords)
+            self.distances = _DenseDistanceStore(dense_matrix, self.vehicle_speed)
+            self.distance_matrix = self.distances.matrix
+            self.travel_time_matrix = self.distances.time_matrix
+        elif storage == "mmap_triangle":
+            tri_path = f"{self._cache_stem}.tri.f32"
+            expected_bytes = _TriangularDistanceStore.packed_length(len(self.coords)) * np.dtype(np.float32).itemsize
+            if not os.path.exists(tri_path) or os.path.getsize(tri_path) != expected_bytes:
+                _TriangularDistanceStore.build(tri_path, self.coords)
+            self.distances = _TriangularDistanceStore(tri_path, len(self.coords), self.vehicle_speed)
+            self.distance_matrix = None
+            self.travel_time_matrix = None
+        elif storage == "matrix_free":
+            self.distances = _CoordinateDistanceStore(self.coords, self.vehicle_speed, config.DISTANCE_ROW_CACHE_SIZE)
+            self.distance_matrix = None
+            self.travel_time_matrix = None
+        else:
+            raise ValueError(f"Unknown DISTANCE_STORAGE in config: {storage}")
         
-        self.fe_vehicle_capacity = df.iloc[0]['FE Cap']
-        self.se_vehicle_capacity = df.iloc[0]['SE Cap']
-        self.vehicle_speed = vehicle_speed
-        
-        nodes = [self.depot] + self.satellites + self.customers
-        self.dist_matrix = {n1.id: {n2.id: math.sqrt((n1.x - n2.x)**2 + (n1.y - n2.y)**2) for n2 in nodes} for n1 in nodes}
-        
-        self._max_dist = 0.0
-        for row in self.dist_matrix.values():
-            if not row: continue
-            max_row = max(row.values())
-            if max_row > self._max_dist:
-                self._max_dist = max_row
-        
-        self._max_due_time = 0.0
-        self._max_demand = 0.0
-        for cust in self.customers:
-            if cust.due_time > self._max_due_time:
-                self._max_due_time = cust.due_time
-            if cust.demand > self._max_demand:
-                self._max_demand = cust.demand
+        self._dist_item = self.distances.item
+        self._time_item = self.distances.time_item
 
-        print("\nPre-processing for pruning candidate lists...")
-        self._precompute_neighbors()
-        print("Pre-processing complete.")
+    @property
+    def dist_matrix(self) -> Mapping:
+        return _DistanceMatrixView(self.distances, self._node_ids.tolist())
 
     def get_distance(self, n1, n2):
-        return self.dist_matrix.get(n1, {}).get(n2, float('inf'))
+        try:
+            return self._dist_item(n1, n2)
+        except IndexError:
+            return float('inf')
     
     def get_travel_time(self, n1, n2):
-        return self.get_distance(n1, n2) / self.vehicle_speed if self.vehicle_speed > 0 else float('inf')
+        try:
+            return self._time_item(n1, n2)
+        except IndexError:
+            return float('inf')
+
+    def get_distances(self, n1, n2s):
+        """ Truy vấn theo lô: khoảng cách từ n1 (hoặc mảng n1) tới mảng n2s. """
+        return self.distances.take(n1, n2s)
+
+    def get_travel_times(self, n1, n2s):
+        return self.distances.take_time(n1, n2s)
 
     def _precompute_neighbors(self):
-        self.customer_neighbors = {}
-        k = config.PRUNING_K_CUSTOMER_NEIGHBORS
-        if k > 0:
-            for cust1 in self.customers:
-                neighbors = []
-                for cust2 in self.customers:
-                    if cust1.id == cust2.id:
-                        continue
-                    dist = self.get_distance(cust1.id, cust2.id)
-                    neighbors.append((cust2, dist))
-                neighbors.sort(key=lambda x: x[1])
-                self.customer_neighbors[cust1.id] = [neighbor_cust for neighbor_cust, dist in neighbors[:k]]
-
-        self.satellite_neighbors = {}
-        m = config.PRUNING_M_SATELLITE_NEIGHBORS
-        if m > 0:
-            for cust in self.customers:
-                neighbors = []
-                for sat in self.satellites:
-                    dist = self.get_distance(cust.id, sat.id)
-                    neighbors.append((sat, dist))
-                neighbors.sort(key=lambda x: x[1])
-                self.satellite_neighbors[cust.id] = [neighbor_sat for neighbor_sat, dist in neighbors[:m]]
\ No newline at end of file
+        """ Bảng láng giềng gần nhất (mảng chỉ số node int32, mỗi hàng ứng với một khách hàng), truy vấn qua lưới không gian. """
+        k = min(max(config.PRUNING_K_CUSTOMER_NEIGHBORS, 0), max(len(self.customer_ids) - 1, 0))
+        self.customer_neighbor_ids = self.customer_grid.k_nearest(self.customer_ids, k, self.get_distances, exclude_self=True)
+        m = min(max(config.PRUNING_M_SATELLITE_NEIGHBORS, 0), len(self.satellite_ids))
+        self.satellite_neighbor_ids = self.satellite_grid.k_nearest(self.customer_ids, m, self.get_distances)
+        self._build_neighbor_views()
+
+    def _build_neighbor_views(self):
+        cust_rows = self.customer_index if config.PRUNING_K_CUSTOMER_NEIGHBORS > 0 else {}
+        sat_rows = self.customer_index if config.PRUNING_M_SATELLITE_NEIGHBORS > 0 else {}
+        self.customer_neighbors = _NeighborView(self.customer_neighbor_ids, cust_rows, self)
+        self.satellite_neighbors = _NeighborView(self.satellite_neighbor_ids, sat_rows, self)
+
+    def _precompute_reachability(self):
+        """
+        Khả năng phục vụ (khách hàng, vệ tinh), biết FE luôn rời kho lúc 0 và đi thẳng là nhanh nhất:
+        - đến kịp:   tt(kho, s) + tt(s, c) <= due_time[c]
+        - deadline:  max(tt(kho, s) + tt(s, c), ready_time[c]) + service_time[c] + tt(c, s) + tt(s, kho) <= deadline[c]
+        Từ các vệ tinh đến được, thu hẹp time window thành [earliest_start, latest_start] cho từng khách hàng.
+        """
+        cust, sats = self.customer_ids, self.satellite_ids
+        depot_ids = np.flatnonzero(self.columns['type'] == 0)
+        arrays = self.node_arrays
+        ready, service = arrays['ready_time'][cust], arrays['service_time'][cust]
+        due, deadline = arrays['due_time'][cust], arrays['deadline'][cust]
+        
+        if len(depot_ids) and len(sats):
+            depot_id = int(depot_ids[0])
+            fe_out = self.get_travel_times(depot_id, sats)[None, :]
+            fe_back = self.get_travel_times(sats, depot_id)[None, :]
+            se_out = self.get_travel_times(sats[None, :], cust[:, None])
+            se_back = self.get_travel_times(cust[:, None], sats[None, :])
+            arrival = fe_out + se_out
+            start = np.maximum(arrival, ready[:, None])
+            latest_by_deadline = deadline[:, None] - service[:, None] - se_back - fe_back
+            reachable = ~(arrival > due[:, None] + 1e-6) & ~(start > latest_by_deadline + 1e-6)
+        else:
+            start = latest_by_deadline = np.zeros((len(cust), len(sats)))
+            reachable = np.zeros((len(cust), len(sats)), dtype=bool)
+        self.satellite_reachable = reachable
+        
+        earliest = np.maximum(ready, np.where(reachable, start, np.inf).min(axis=1, initial=np.inf))
+        latest = np.minimum(due, np.where(reachable, latest_by_deadline, -np.inf).max(axis=1, initial=-np.inf))
+        servable = reachable.any(axis=1)
+        earliest_start, latest_start = arrays['ready_time'].copy(), arrays['due_time'].copy()
+        earliest_start[cust[servable]] = earliest[servable]
+        latest_start[cust[servable]] = latest[servable]
+        # Customer ids < n_rows nên alias coll_id của vệ tinh giữ nguyên giá trị (0, inf)
+        arrays['earliest_start'], arrays['latest_start'] = earliest_start, latest_start
+        self.earliest_start, self.latest_start = earliest_start.tolist(), latest_start.tolist()
+        
+        sat_list = sats.tolist()
+        self.reachable_satellite_ids = {
+            cust_id: frozenset(sat_list[j] for j in np.flatnonzero(row).tolist())
+            for cust_id, row in zip(cust.tolist(), reachable)
+        }
+        self.unservable_customer_ids = frozenset(cust[~servable].tolist())
+
+    def _precompute_singleton_routes(self):
+        """
+        Bảng route một khách hàng cho mọi cặp (khách hàng, vệ tinh), mảng C x S theo customer_ids / satellite_ids.
+        Hồ sơ thời gian theo đúng thứ tự phép tính của calculate_se_time_profile; FE riêng rời kho lúc 0.
+        """
+        cust, sats = self.customer_ids, self.satellite_ids
+        arrays = self.node_arrays
+        ready, due, service = arrays['ready_time'][cust][:, None], arrays['due_time'][cust][:, None], arrays['service_time'][cust][:, None]
+        demand, is_delivery = np.abs(arrays['signed_demand'][cust])[:, None], arrays['is_delivery'][cust][:, None]
+        sat_service, sat_ready = arrays['service_time'][sats][None, :], arrays['ready_time'][sats][None, :]
+        offset_cust = sat_service + self.get_travel_times(sats[None, :], cust[:, None])
+        duration = offset_cust + (service + self.get_travel_times(cust[:, None], sats[None, :]))
+        release = np.maximum(ready - offset_cust, sat_ready - duration)
+        latest = np.where(ready - offset_cust > due - offset_cust + 1e-6, -np.inf, due - offset_cust)
+        table = {
+            'total_dist': self.get_distances(sats[None, :], cust[:, None]) + self.get_distances(cust[:, None], sats[None, :]),
+            'total_travel_time': self.get_travel_times(sats[None, :], cust[:, None]) + self.get_travel_times(cust[:, None], sats[None, :]),
+            'total_load_delivery': np.broadcast_to(np.where(is_delivery, demand, 0.0), latest.shape),
+            'total_load_pickup': np.broadcast_to(np.where(is_delivery, 0.0, demand), latest.shape),
+            'latest_start_time': latest, 'duration': duration, 'release_time': release,
+            'se_feasible': (latest > -np.inf) & ~(demand > self.se_vehicle_capacity + 1e-6),
+        }
+        depot_ids = np.flatnonzero(self.columns['type'] == 0)
+        if len(depot_ids):
+            depot_id = int(depot_ids[0])
+            arrival = 0.0 + self.get_travel_times(depot_id, sats)[None, :]
+            back_at_depot = duration + np.maximum(arrival, release) + self.get_travel_times(sats, depot_id)[None, :]
+            table['new_fe_feasible'] = (table['se_feasible'] & ~(arrival > latest + 1e-6)
+                                        & ~(back_at_depot > arrays['deadline'][cust][:, None] + 1e-6)
+                                        & ~(table['total_load_delivery'] > self.fe_vehicle_capacity + 1e-6))
+            table['new_fe_dist'] = np.broadcast_to(0.0 + self.get_distances(depot_id, sats) + self.get_distances(sats, depot_id), latest.shape)
+            table['new_fe_travel_time'] = np.broadcast_to(0.0 + self.get_travel_times(depot_id, sats) + self.get_travel_times(sats, depot_id), latest.shape)
+        else:
+            table['new_fe_feasible'] = np.zeros(latest.shape, dtype=bool)
+            table['new_fe_dist'] = table['new_fe_travel_time'] = np.full(latest.shape, np.inf)
+        self.singleton_table = table
+        self._singleton_routes = {}
+
+    def get_singleton_route(self, cust_id: int, sat_id: int) -> SingletonRoute:
+        """ Bản ghi route một khách hàng của cặp (khách hàng, vệ tinh), dựng từ singleton_table ở lần hỏi đầu. """
+        key = (cust_id, sat_id)
+        route = self._singleton_routes.get(key)
+        if route is None:
+            row, col = self.customer_index[cust_id], self.satellite_index[sat_id]
+            value = {name: column[row, col].item() for name, column in self.singleton_table.items()}
+            time_profile = SETimeProfile(value.pop('latest_start_time'), value.pop('duration'), value.pop('release_time'),
+                                         float(self.node_arrays['deadline'][cust_id]))
+            route = self._singleton_routes[key] = SingletonRoute(
+                customer_id=cust_id, satellite=self.node_objects[sat_id], time_profile=time_profile, **value)
+        return route
+
+    def satellite_mask(self, sat_ids) -> int:
+        """ Bitmask của một tập vệ tinh, bit thứ satellite_index[id]. """
+        index, mask = self.satellite_index, 0
+        for sat_id in sat_ids: mask |= 1 << index[sat_id]
+        return mask
+
+    def get_fe_tour(self, mask: int) -> FETour:
+        """
+        FE đi qua các vệ tinh theo thứ tự cố định (gần kho trước) nên thứ tự ghé và chi phí FE chỉ phụ thuộc tập vệ tinh.
+        Bảng theo bitmask, điền dần khi có tập mới; phép cộng theo đúng thứ tự các chặng của lộ trình.
+        """
+        tour = self._fe_tours.get(mask)
+        if tour is None:
+            depot_id = self.depot.id
+            satellites = sorted((sat for sat in self.satellites if mask >> self.satellite_index[sat.id] & 1),
+                                key=lambda sat: (self.get_distance(depot_id, sat.id), sat.id))
+            path = [depot_id, *(sat.id for sat in satellites), depot_id] if satellites else []
+            total_dist, total_travel_time = 0.0, 0.0
+            for i in range(len(path) - 1):
+                total_dist += self.get_distance(path[i], path[i+1])
+                total_travel_time += self.get_travel_time(path[i], path[i+1])
+            tour = self._fe_tours[mask] = FETour(tuple(satellites), total_dist, total_travel_time)
+        return tour
+
+    def _precompute_tw_compatibility(self, chunk_size=1024):
+        """
+        Ma trận "i có thể đứng ngay trước j" (bit-packed, mỗi hàng một node id), dùng time window đã thu hẹp:
+        earliest_start[i] + service_time[i] + travel_time(i, j) <= latest_start[j].
+        Vệ tinh/kho không có time window nên luôn tương thích ở cả hai chiều.
+        """
+        n_rows = len(self.coords)
+        ready = self.node_arrays['earliest_start'][:n_rows]
+        service = self.node_arrays['service_time'][:n_rows]
+        due = self.node_arrays['latest_start'][:n_rows]
+        all_ids = np.arange(n_rows)
+        packed = np.full((n_rows, (n_rows + 7) // 8), 0xFF, dtype=np.uint8)
+        for start in range(0, len(self.customer_ids), chunk_size):
+            rows = self.customer_ids[start:start + chunk_size]
+            earliest_arrival = ready[rows, None] + service[rows, None] + self.get_travel_times(rows[:, None], all_ids[None, :])
+            # So sánh phủ định để NaN (dữ liệu thiếu) được coi là tương thích, giống kiểm tra '>' khi xếp lịch
+            compatible = ~(earliest_arrival > due[None, :] + 1e-6)
+            packed[rows] = np.packbits(compatible, axis=1, bitorder='little')
+        self._set_tw_compatibility(packed)
+
+    def _set_tw_compatibility(self, packed):
+        self.tw_compatible = packed
+        # Mỗi hàng là một bytes: tra bit (i, j) bằng tw_successors[i][j >> 3] >> (j & 7) & 1, O(1) trong vòng lặp Python
+        self.tw_successors = [row.tobytes() for row in packed]
+
+    def can_precede(self, i, j) -> bool:
+        i, j = self.base_id[i], self.base_id[j]
+        return bool(self.tw_successors[i][j >> 3] >> (j & 7) & 1)
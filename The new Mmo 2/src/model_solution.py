@@ -5,6 +5,7 @@ from dataclasses import dataclass, field # <<< SỬA Ở ĐÂY: THÊM 'field' V
 
 if TYPE_CHECKING:
     from model_problem import ProblemInstance
+    from logic_schedule import FESchedule
 
 # ==============================================================================
 # DOP DATA STRUCTURES (CẤU TRÚC DỮ LIỆU DUY NHẤT)
@@ -23,12 +24,15 @@ class SERouteData:
     service_start_times: dict[int, float]
     waiting_times: dict[int, float]
     forward_time_slacks: dict[int, float]
+    # Max tải tiền tố / hậu tố theo vị trí, để kiểm tra tải khi chèn trong O(1); rỗng với route tạm
+    prefix_max_load: tuple[float, ...] = ()
+    suffix_max_load: tuple[float, ...] = ()
 
 @dataclass(frozen=True)
 class FERouteData:
     """ Dữ liệu thuần túy, bất biến cho một FE Route. """
     serviced_se_route_indices: tuple[int, ...]
-    schedule: tuple[dict, ...]
+    schedule: FESchedule  # dùng chung giữa các bản FERouteData, không sửa tại chỗ
     total_dist: float
     total_time: float
     total_travel_time: float
@@ -43,16 +47,19 @@ class SolutionData:
     unserved_customer_ids: tuple[int, ...]
     # Map được tạo động để tăng tốc truy vấn, không phải là một phần của trạng thái cốt lõi
     customer_to_se_route_idx: dict[int, int] = field(init=False, repr=False)
+    # Vị trí của khách hàng trong nodes_id của SE route chứa nó (tra cứu node liền trước / liền sau O(1))
+    customer_to_se_position: dict[int, int] = field(init=False, repr=False)
 
     def __post_init__(self):
         # Tạo map sau khi đối tượng được khởi tạo
         # Dùng object.__setattr__ vì dataclass là frozen=True
-        cust_map = {
-            cust_id: se_idx
-            for se_idx, se_route in enumerate(self.se_routes)
-            for cust_id in se_route.nodes_id[1:-1]
-        }
+        cust_map, pos_map = {}, {}
+        for se_idx, se_route in enumerate(self.se_routes):
+            for pos in range(1, len(se_route.nodes_id) - 1):
+                cust_id = se_route.nodes_id[pos]
+                cust_map[cust_id], pos_map[cust_id] = se_idx, pos
         object.__setattr__(self, 'customer_to_se_route_idx', cust_map)
+        object.__setattr__(self, 'customer_to_se_position', pos_map)
 
 # ==============================================================================
 # STATE MANAGEMENT (QUẢN LÝ TRẠNG THÁI)
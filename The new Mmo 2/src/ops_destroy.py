@@ -138,14 +138,10 @@ def worst_cost_removal(solution_data: SolutionData, q: int, p: int = 3) -> Tuple
     
     cost_func = problem.get_distance if config.PRIMARY_OBJECTIVE == "DISTANCE" else problem.get_travel_time
 
+    positions = solution_data.customer_to_se_position
     for cust_id, se_idx in solution_data.customer_to_se_route_idx.items():
         se_route = solution_data.se_routes[se_idx]
-        if cust_id not in se_route.nodes_id: continue
-        try:
-            pos = se_route.nodes_id.index(cust_id)
-        except ValueError:
-            continue
-        if pos == 0 or pos == len(se_route.nodes_id) - 1: continue
+        pos = positions[cust_id]
             
         prev_node_id = se_route.nodes_id[pos - 1]
         next_node_id = se_route.nodes_id[pos + 1]
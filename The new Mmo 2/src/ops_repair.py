@@ -2,6 +2,7 @@
 import random
 from typing import List, Dict
 
+from logic_schedule import FESchedule
 from model_solution import SolutionData, SERouteData, FERouteData
 from model_problem import Customer, ProblemInstance
 from logic_core import (
@@ -49,7 +50,7 @@ def _apply_insertion(solution_data: SolutionData, customer: Customer, best_optio
         new_se = SERouteData(sat_id, new_nodes, 0,0,0,0,{},{},{})
         temp_se_routes.append(new_se)
         # Tạo FE route mới phục vụ nó
-        new_fe = FERouteData(serviced_se_route_indices=(len(temp_se_routes) - 1,), schedule=tuple(), total_dist=0, total_time=0, total_travel_time=0, route_deadline=float('inf'))
+        new_fe = FERouteData(serviced_se_route_indices=(len(temp_se_routes) - 1,), schedule=FESchedule(), total_dist=0, total_time=0, total_travel_time=0, route_deadline=float('inf'))
         temp_fe_routes.append(new_fe)
 
     elif option_type == 'create_new_se_expand_fe':
@@ -82,11 +82,7 @@ def _format_fe_route_data(fe_route: FERouteData, problem, route_idx: int) -> str
         lines.append("--- Empty FERoute ---")
         return "\n".join(lines)
         
-    path_nodes = [fe_route.schedule[0]['node_id']]
-    for event in fe_route.schedule[1:]:
-        if event['node_id'] != path_nodes[-1]: 
-            path_nodes.append(event['node_id'])
-    path_str = " -> ".join(map(str, path_nodes))
+    path_str = " -> ".join(map(str, fe_route.schedule.path()))
     
     deadline_str = f"Route Deadline: {fe_route.route_deadline:.2f}" if fe_route.route_deadline != float('inf') else "No Deadline"
     lines.append(f"--- FERoute (Cost: {fe_route.total_dist:.2f}, Time: {fe_route.total_time:.2f}) --- {deadline_str}")
@@ -97,8 +93,8 @@ def _format_fe_route_data(fe_route: FERouteData, problem, route_idx: int) -> str
     lines.append("  " + "-" * len(tbl_header))
     
     for event in fe_route.schedule:
-        lines.append(f"  {event['activity']:<15}| {event['node_id']:<6}| {event['load_after']:>12.2f}| "
-                     f"{event['arrival_time']:>9.2f}| {event['departure_time']:>11.2f}")
+        lines.append(f"  {event.activity.name:<15}| {event.node_id:<6}| {event.load_after:>12.2f}| "
+                     f"{event.arrival_time:>9.2f}| {event.departure_time:>11.2f}")
     return "\n".join(lines)
 
 # ==============================================================================
@@ -177,12 +173,12 @@ def validate_solution_feasibility_dop(solution_data: SolutionData):
     for i, fe_route in enumerate(solution_data.fe_routes):
         if not fe_route.schedule: continue
         # Load Check
-        for event in fe_route.schedule:
-            if event['load_after'] > problem.fe_vehicle_capacity + 1e-6:
-                errors.append(f"FE Route #{i+1}: Capacity violation at node {event['node_id']} (Load: {event['load_after']:.2f})")
+        for node_id, load_after in zip(fe_route.schedule.node_id, fe_route.schedule.load_after):
+            if load_after > problem.fe_vehicle_capacity + 1e-6:
+                errors.append(f"FE Route #{i+1}: Capacity violation at node {node_id} (Load: {load_after:.2f})")
         
         # Deadline Check
-        arrival_at_depot = fe_route.schedule[-1]['arrival_time']
+        arrival_at_depot = fe_route.schedule.arrival_time[-1]
         
         # Tìm deadline chặt nhất của các khách hàng được phục vụ bởi FE này
         deadlines = []
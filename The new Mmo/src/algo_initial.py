@@ -4,8 +4,7 @@ from model_solution import VRP2E_State, Solution, SERoute, FERoute
 from model_problem import ProblemInstance
 from logic_core import (
     InsertionProcessor, 
-    find_best_global_insertion_option, 
-    _recalculate_fe_route_and_check_feasibility
+    find_best_global_insertion_option
 )
 from algo_alns import run_local_search_phase
 from ops_destroy import random_removal
@@ -22,6 +21,13 @@ def create_integrated_initial_solution(problem: ProblemInstance, random_customer
         random.shuffle(customers_to_serve)
     
     solution.unserved_customers = []
+    
+    # Khách hàng không thể phục vụ từ bất kỳ vệ tinh nào: đánh dấu ngay, không thử chèn
+    unservable = [c for c in customers_to_serve if c.id in problem.unservable_customer_ids]
+    if unservable:
+        solution.unserved_customers.extend(unservable)
+        customers_to_serve = [c for c in customers_to_serve if c.id not in problem.unservable_customer_ids]
+        print(f"Warning: {len(unservable)} customer(s) unreachable from every satellite: {sorted(c.id for c in unservable)}")
 
     print("--- Phase 1a: Greedy Insertion Construction ---")
     for i, customer in enumerate(customers_to_serve):
@@ -32,10 +38,8 @@ def create_integrated_initial_solution(problem: ProblemInstance, random_customer
 
         if option_type == 'insert_into_existing_se':
             se_route, pos = best_option['se_route'], best_option['se_pos']
-            fe_route = list(se_route.serving_fe_routes)[0]
             se_route.insert_customer_at_pos(customer, pos)
-            solution.update_customer_map()
-            _recalculate_fe_route_and_check_feasibility(fe_route, problem)
+            solution.map_customer(customer.id, se_route)
         elif option_type == 'create_new_se_new_fe':
             satellite = best_option['new_satellite']
             new_se = SERoute(satellite, solution.problem)
@@ -44,14 +48,12 @@ def create_integrated_initial_solution(problem: ProblemInstance, random_customer
             new_fe = FERoute(solution.problem)
             solution.add_fe_route(new_fe)
             solution.link_routes(new_fe, new_se)
-            _recalculate_fe_route_and_check_feasibility(new_fe, problem)
         elif option_type == 'create_new_se_expand_fe':
             satellite, fe_route = best_option['new_satellite'], best_option['fe_route']
             new_se = SERoute(satellite, solution.problem)
             new_se.insert_customer_at_pos(customer, 1)
             solution.add_se_route(new_se)
             solution.link_routes(fe_route, new_se)
-            _recalculate_fe_route_and_check_feasibility(fe_route, problem)
         else: 
             solution.unserved_customers.append(customer)
             print(f"\nWarning: Could not serve customer {customer.id}")
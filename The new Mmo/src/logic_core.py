@@ -2,9 +2,10 @@
 import copy
 import heapq
 import itertools
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, List
 
 import config
+from logic_schedule import SETimeProfile, calculate_se_insertion_time_profile
 from model_solution import SERoute, FERoute, Solution
 from model_problem import ProblemInstance, Customer
 
@@ -15,44 +16,47 @@ class InsertionProcessor:
     def find_all_feasible_insertions_for_se_route(self, route: SERoute, customer: Customer) -> List[Dict]:
         feasible_options = []
         problem = route.problem
-        for i in range(len(route.nodes_id) - 1):
+        base_id = problem.base_id
+        cust_id = customer.id
+        is_delivery = problem.is_delivery[cust_id]
+        load_limit = problem.se_vehicle_capacity + 1e-6 - customer.demand
+        prefix_max_load, suffix_max_load = route.prefix_max_load, route.suffix_max_load
+        tw_successors = problem.tw_successors
+        cust_successors, cust_byte, cust_bit = tw_successors[cust_id], cust_id >> 3, cust_id & 7
+        ready_time, service_time = problem.ready_time, problem.service_time
+        cust_latest, cust_ready, cust_service = problem.latest_start[cust_id], ready_time[cust_id], service_time[cust_id]
+        nodes_id, starts, slacks = route.nodes_id, route.service_start_times, route.forward_time_slacks
+        for i in range(len(nodes_id) - 1):
             pos_to_insert = i + 1
-            temp_nodes_id = route.nodes_id[:pos_to_insert] + [customer.id] + route.nodes_id[pos_to_insert:]
             
-            # Check SE Capacity
-            new_delivery_load = route.total_load_delivery
-            if customer.type == 'DeliveryCustomer': 
-                new_delivery_load += customer.demand
-            if new_delivery_load > problem.se_vehicle_capacity + 1e-6: 
-                break 
+            # Check SE Capacity, O(1) qua max tải tiền tố / hậu tố của route
+            if is_delivery:
+                if prefix_max_load[i] > load_limit:
+                    break  # prefix max không giảm theo vị trí: các vị trí sau cũng quá tải
+            elif suffix_max_load[i] > load_limit:
+                continue
             
-            running_load = new_delivery_load
-            is_load_feasible = True
-            for node_id in temp_nodes_id[1:-1]:
-                cust_obj = problem.node_objects[node_id]
-                if cust_obj.type == 'DeliveryCustomer': 
-                    running_load -= cust_obj.demand
-                else: 
-                    running_load += cust_obj.demand
-                
-                if running_load < -1e-6 or running_load > problem.se_vehicle_capacity + 1e-6:
-                    is_load_feasible = False
-                    break
+            prev_id, next_id = base_id[nodes_id[i]], base_id[nodes_id[pos_to_insert]]
             
-            if not is_load_feasible: 
+            # Check TW compatibility (prev -> customer -> next), O(1) qua ma trận tiền xử lý
+            if not (tw_successors[prev_id][cust_byte] >> cust_bit & 1 and cust_successors[next_id >> 3] >> (next_id & 7) & 1):
                 continue
-
-            prev_node_id = route.nodes_id[pos_to_insert - 1]
-            next_node_id = route.nodes_id[pos_to_insert]
-            prev_obj = problem.node_objects[prev_node_id % problem.total_nodes]
-            next_obj = problem.node_objects[next_node_id % problem.total_nodes]
             
-            dist_increase = (problem.get_distance(prev_obj.id, customer.id) + 
-                             problem.get_distance(customer.id, next_obj.id) - 
-                             problem.get_distance(prev_obj.id, next_obj.id))
-            time_increase = (problem.get_travel_time(prev_obj.id, customer.id) + 
-                             problem.get_travel_time(customer.id, next_obj.id) - 
-                             problem.get_travel_time(prev_obj.id, next_obj.id))
+            # Check TW (Savelsbergh), O(1): customer phải kịp time window, và độ đẩy lịch tại next
+            # không vượt forward slack của next (lịch bắt đầu tại vệ tinh không đổi khi chèn vào route có sẵn)
+            time_prev_cust = problem.get_travel_time(prev_id, cust_id)
+            time_cust_next = problem.get_travel_time(cust_id, next_id)
+            start_cust = max(starts[i] + service_time[prev_id] + time_prev_cust, cust_ready)
+            if start_cust > cust_latest + 1e-6:
+                continue
+            push_next = max(start_cust + cust_service + time_cust_next, ready_time[next_id]) - starts[pos_to_insert]
+            if push_next > slacks[pos_to_insert] + 1e-6:
+                continue
+            
+            dist_increase = (problem.get_distance(prev_id, cust_id) + 
+                             problem.get_distance(cust_id, next_id) - 
+                             problem.get_distance(prev_id, next_id))
+            time_increase = time_prev_cust + time_cust_next - problem.get_travel_time(prev_id, next_id)
             
             feasible_options.append({
                 "pos": pos_to_insert, 
@@ -65,107 +69,87 @@ class InsertionProcessor:
 # CORE SYNCHRONIZATION LOGIC (FE-SE HANDSHAKE)
 # ==============================================================================
 
-def _recalculate_fe_route_and_check_feasibility(fe_route: FERoute, problem: ProblemInstance) -> Tuple[bool, Optional[float], Optional[float]]:
+def _probe_fe_synchronization(fe_route: FERoute, problem: ProblemInstance, changed_se, changed_profile: SETimeProfile,
+                              delivery_increase: float, satellite_mask: int) -> bool:
     """
-    Tính toán lại lộ trình FE và kiểm tra tính khả thi.
-    Giữ nguyên logic: Static Sorting & Hard Blocking.
+    Mô phỏng chỉ-đọc của FERoute.synchronize khi SE route changed_se mang hồ sơ thời gian
+    changed_profile và FE chở thêm delivery_increase; changed_se chưa thuộc fe_route thì coi như được thêm vào.
+    Không ghi vào route thật, không dựng schedule: chỉ lan truyền thời điểm đến / rời từng vệ tinh.
     """
-    if not fe_route.serviced_se_routes:
-        fe_route.total_dist = 0.0
-        fe_route.schedule = []
-        fe_route.calculate_route_properties()
-        return True, 0.0, 0.0
-        
-    depot = problem.depot
-    
-    # 1. Tính tải trọng ban đầu
-    initial_delivery_load = sum(se.total_load_delivery for se in fe_route.serviced_se_routes)
-    
-    # 2. Kiểm tra tải trọng ngay lập tức
+    initial_delivery_load = fe_route.total_load_delivery + delivery_increase
     if initial_delivery_load > problem.fe_vehicle_capacity + 1e-6:
-        return False, None, None
+        return False
 
-    sats_to_visit = {se.satellite for se in fe_route.serviced_se_routes}
-    
-    # --- STATIC SORTING: Luôn đi từ vệ tinh gần Depot nhất ---
-    sats_list = sorted(list(sats_to_visit), key=lambda s: problem.get_distance(depot.id, s.id))
-    
-    schedule = []
+    se_routes_by_satellite = fe_route.se_routes_by_satellite
+    is_new = changed_se not in fe_route.serviced_se_routes
+    changed_sat_id = changed_se.satellite.id
     current_time = 0.0
-    current_load = initial_delivery_load
-    
-    schedule.append({
-        'activity': 'DEPART_DEPOT', 'node_id': depot.id, 'load_change': current_load, 
-        'load_after': current_load, 'arrival_time': 0.0, 'start_svc_time': 0.0, 'departure_time': 0.0
-    })
-    
-    last_node_id = depot.id
-    route_deadlines = set()
+    last_node_id = problem.depot.id
+    # Deadline của các khách hàng cũ đã có sẵn trên FE; changed_profile gồm cả khách hàng mới
+    effective_deadline = min(fe_route.tightest_deadline(), changed_profile.route_deadline)
 
-    for satellite in sats_list:
+    for satellite in problem.get_fe_tour(satellite_mask).satellites:
         arrival_at_sat = current_time + problem.get_travel_time(last_node_id, satellite.id)
-        
-        se_routes_at_sat = [r for r in fe_route.serviced_se_routes if r.satellite == satellite]
-        del_load_at_sat = sum(r.total_load_delivery for r in se_routes_at_sat)
-        
-        # Unload Delivery
-        current_load -= del_load_at_sat
-        schedule.append({
-            'activity': 'UNLOAD_DELIV', 'node_id': satellite.id, 'load_change': -del_load_at_sat, 
-            'load_after': current_load, 'arrival_time': arrival_at_sat, 
-            'start_svc_time': arrival_at_sat, 'departure_time': arrival_at_sat
-        })
-        
         latest_se_finish = 0
+        se_routes_at_sat = se_routes_by_satellite.get(satellite.id, ())
+        if is_new and satellite.id == changed_sat_id:
+            se_routes_at_sat = itertools.chain(se_routes_at_sat, (changed_se,))
         for se_route in se_routes_at_sat:
-            # --- DOWNSTREAM SYNC: FE đến -> SE được phép chạy ---
-            se_route.service_start_times[se_route.nodes_id[0]] = arrival_at_sat
-            se_route.calculate_full_schedule_and_slacks()
-            
-            # Check SE constraints
-            for cust in se_route.get_customers():
-                if hasattr(cust, 'due_time') and se_route.service_start_times.get(cust.id, float('inf')) > cust.due_time + 1e-6:
-                    return False, None, None
-                if hasattr(cust, 'deadline'): 
-                    route_deadlines.add(cust.deadline)
-            
-            latest_se_finish = max(latest_se_finish, se_route.service_start_times.get(se_route.nodes_id[-1], 0))
-        
-        pickup_load_at_sat = sum(r.total_load_pickup for r in se_routes_at_sat)
-        
-        # --- UPSTREAM SYNC (HARD BLOCKING): FE phải đợi SE chậm nhất ---
-        departure_from_sat = latest_se_finish
-        
-        # Load Pickup
-        current_load += pickup_load_at_sat
-        schedule.append({
-            'activity': 'LOAD_PICKUP', 'node_id': satellite.id, 'load_change': pickup_load_at_sat, 
-            'load_after': current_load, 'arrival_time': latest_se_finish, 
-            'start_svc_time': latest_se_finish, 'departure_time': departure_from_sat
-        })
-        
-        current_time = departure_from_sat
+            profile = changed_profile if se_route is changed_se else se_route.time_profile
+            if not profile.is_feasible_start(arrival_at_sat):
+                return False
+            latest_se_finish = max(latest_se_finish, profile.finish_time(arrival_at_sat))
+        current_time = latest_se_finish
         last_node_id = satellite.id
 
-    arrival_at_depot = current_time + problem.get_travel_time(last_node_id, depot.id)
-    schedule.append({
-        'activity': 'ARRIVE_DEPOT', 'node_id': depot.id, 'load_change': -current_load, 
-        'load_after': 0, 'arrival_time': arrival_at_depot, 
-        'start_svc_time': arrival_at_depot, 'departure_time': arrival_at_depot
-    })
-    
-    fe_route.schedule = schedule
-    fe_route.calculate_route_properties()
-    
-    effective_deadline = min(route_deadlines) if route_deadlines else float('inf')
-    if arrival_at_depot > effective_deadline + 1e-6:
-        return False, None, None
-        
-    return True, fe_route.total_dist, fe_route.total_travel_time
+    arrival_at_depot = current_time + problem.get_travel_time(last_node_id, problem.depot.id)
+    return arrival_at_depot <= effective_deadline + 1e-6
+
+def evaluate_insertion(fe_route: FERoute, se_route: SERoute, customer: Customer, pos: int) -> bool:
+    """
+    Thử chèn customer vào se_route (đang được fe_route phục vụ) tại vị trí pos mà không sửa route nào.
+    Trả về khả thi đồng bộ FE-SE; mức tăng mục tiêu do nơi gọi tính trước (để lọc top-k trước khi dò).
+    """
+    problem = se_route.problem
+    profile = calculate_se_insertion_time_profile(problem, se_route.nodes_id, customer.id, pos)
+    delivery_increase = customer.demand if problem.is_delivery[customer.id] else 0.0
+    return _probe_fe_synchronization(fe_route, problem, se_route, profile, delivery_increase, fe_route.satellite_mask)
 
-def _calculate_route_proximity(customer: Customer, se_route: SERoute, problem: ProblemInstance) -> float:
-    if not se_route.get_customers(): return problem.get_distance(customer.id, se_route.satellite.id)
-    return min(problem.get_distance(customer.id, c.id) for c in se_route.get_customers())
+def evaluate_new_se_insertion(fe_route: FERoute, new_se_route) -> bool:
+    """
+    Thử cho fe_route phục vụ thêm một SE route mới (ví dụ SingletonRoute) mà không sửa fe_route.
+    Trả về khả thi đồng bộ FE-SE; mức tăng mục tiêu do nơi gọi tính trước từ bảng tour FE theo tập vệ tinh.
+    """
+    problem = fe_route.problem
+    satellite_mask = fe_route.satellite_mask | 1 << problem.satellite_index[new_se_route.satellite.id]
+    return _probe_fe_synchronization(fe_route, problem, new_se_route, new_se_route.time_profile,
+                                     new_se_route.total_load_delivery, satellite_mask)
+
+def _find_nearest_se_routes(customer: Customer, solution: Solution, n: int) -> List[SERoute]:
+    """
+    n SE route (đang được FE phục vụ, từ vệ tinh đến được khách hàng) gần khách hàng nhất,
+    đo bằng khoảng cách tới khách hàng gần nhất của route.
+    Quét lưới khách hàng theo vòng từ trong ra ngoài, tra route qua customer_to_se_route_map,
+    và dừng khi route thứ n đã gần hơn cận dưới của vòng kế tiếp.
+    (SE route rỗng đã bị gỡ khỏi lời giải ở bước destroy nên không cần xét riêng.)
+    """
+    if n <= 0: return []
+    problem = solution.problem
+    route_of = solution.customer_to_se_route_map
+    reachable = problem.reachable_satellite_ids[customer.id]
+    best: Dict[SERoute, float] = {}
+    x, y = problem.coords[customer.id].tolist()
+    for bound, ring_ids in problem.customer_grid.iter_rings(x, y):
+        if len(best) >= n and heapq.nsmallest(n, best.values())[-1] <= bound:
+            break
+        members = [cid for cid in ring_ids.tolist()
+                   if cid in route_of and route_of[cid].serving_fe_routes and route_of[cid].satellite.id in reachable]
+        if not members: continue
+        for cid, dist in zip(members, problem.get_distances(customer.id, members).tolist()):
+            route = route_of[cid]
+            if dist < best.get(route, float('inf')):
+                best[route] = dist
+    return sorted(best, key=best.get)[:n]
 
 def find_k_best_global_insertion_options_combined(customer: Customer, solution: Solution, insertion_processor: InsertionProcessor, k: int) -> List[Dict]:
     problem = solution.problem
@@ -174,6 +158,14 @@ def find_k_best_global_insertion_options_combined(customer: Customer, solution:
     
     primary_route_attr = 'total_dist' if config.PRIMARY_OBJECTIVE == "DISTANCE" else 'total_travel_time'
     
+    # Khách hàng không vệ tinh nào phục vụ kịp: không cần thử bất kỳ phương án nào
+    if customer.id in problem.unservable_customer_ids:
+        return []
+    reachable_satellites = problem.reachable_satellite_ids[customer.id]
+    
+    def can_enter_heap(objective_increase):
+        return len(best_options_heap) < k or objective_increase < -best_options_heap[0][0]
+
     def add_option_to_heap(objective_increase, option_details):
         count = next(counter)
         if len(best_options_heap) < k: 
@@ -182,101 +174,79 @@ def find_k_best_global_insertion_options_combined(customer: Customer, solution:
             heapq.heapreplace(best_options_heap, (-objective_increase, count, option_details))
             
     # Option 1: Insert into existing SE
-    candidate_se_routes = sorted(
-        [r for r in solution.se_routes if r.serving_fe_routes], 
-        key=lambda r: _calculate_route_proximity(customer, r, problem)
-    )
+    candidate_se_routes = _find_nearest_se_routes(customer, solution, config.PRUNING_N_SE_ROUTE_CANDIDATES)
     
-    for se_route in candidate_se_routes[:config.PRUNING_N_SE_ROUTE_CANDIDATES]:
+    for se_route in candidate_se_routes:
         local_insertions = insertion_processor.find_all_feasible_insertions_for_se_route(se_route, customer)
         if not local_insertions: continue
         
+        se_primary = getattr(se_route, primary_route_attr)
         for local_option in local_insertions:
-            fe_route = list(se_route.serving_fe_routes)[0]
-            fe_memento = fe_route.backup()
-            se_mementos = {se: se.backup() for se in fe_route.serviced_se_routes}
-            
-            try:
-                se_route_to_modify = next(se for se in fe_route.serviced_se_routes if se is se_route)
-                se_route_to_modify.insert_customer_at_pos(customer, local_option['pos'])
-                
-                is_feasible, _, _ = _recalculate_fe_route_and_check_feasibility(fe_route, problem)
-                
-                if is_feasible:
-                    primary_increase = (
-                        (getattr(se_route_to_modify, primary_route_attr) - getattr(se_mementos[se_route_to_modify], primary_route_attr)) + 
-                        (getattr(fe_route, primary_route_attr) - getattr(fe_memento, primary_route_attr))
-                    )
-                    objective_increase = config.WEIGHT_PRIMARY * primary_increase
-                    
-                    option = {
-                        'objective_increase': objective_increase, 
-                        'type': 'insert_into_existing_se', 
-                        'se_route': se_route, 
-                        'se_pos': local_option['pos']
-                    }
-                    add_option_to_heap(objective_increase, option)
-            finally:
-                fe_route.restore(fe_memento)
-                for se, memento in se_mementos.items(): se.restore(memento)
+            # Tập vệ tinh của FE không đổi nên chi phí FE không đổi: mục tiêu biết trước,
+            # chỉ mô phỏng lịch FE (kiểm tra khả thi) khi phương án có thể vào top-k
+            se_increase = local_option['dist_increase'] if primary_route_attr == 'total_dist' else local_option['time_increase']
+            objective_increase = config.WEIGHT_PRIMARY * ((se_primary + se_increase) - se_primary)
+            if not can_enter_heap(objective_increase): continue
+            fe_route = next(iter(se_route.serving_fe_routes))
+            # Thử chỉ-đọc: không sửa route thật nên không cần backup / restore
+            is_feasible = evaluate_insertion(fe_route, se_route, customer, local_option['pos'])
+            if is_feasible:
+                option = {
+                    'objective_increase': objective_increase, 
+                    'type': 'insert_into_existing_se', 
+                    'se_route': se_route, 
+                    'se_pos': local_option['pos']
+                }
+                add_option_to_heap(objective_increase, option)
 
     # Option 2 & 3: Create New SE (and New/Expand FE)
     candidate_satellites = problem.satellite_neighbors.get(customer.id, problem.satellites)
     for satellite in candidate_satellites:
-        # Temp SE Check
-        temp_new_se = SERoute(satellite, problem)
-        temp_new_se.insert_customer_at_pos(customer, 1)
+        if satellite.id not in reachable_satellites: continue
+        # SE mới một khách hàng (và FE riêng cho nó) chỉ phụ thuộc cặp (khách hàng, vệ tinh): tra bảng tính sẵn
+        temp_new_se = problem.get_singleton_route(customer.id, satellite.id)
+        if not temp_new_se.se_feasible: continue
         
-        if temp_new_se.total_load_delivery <= problem.fe_vehicle_capacity + 1e-6:
-            # 2. New SE + New FE
-            temp_fe_for_new = FERoute(problem)
-            temp_fe_for_new.add_serviced_se_route(temp_new_se)
-            is_feasible, new_fe_dist, new_fe_time = _recalculate_fe_route_and_check_feasibility(temp_fe_for_new, problem)
+        # 2. New SE + New FE (khả thi của FE riêng đã gồm tải trọng FE)
+        if temp_new_se.new_fe_feasible:
+            new_fe_primary = temp_new_se.new_fe_dist if config.PRIMARY_OBJECTIVE == "DISTANCE" else temp_new_se.new_fe_travel_time
+            primary_increase = getattr(temp_new_se, primary_route_attr) + new_fe_primary
+            objective_increase = config.WEIGHT_PRIMARY * primary_increase
+            if config.OPTIMIZE_VEHICLE_COUNT: 
+                objective_increase += config.WEIGHT_SE_VEHICLE + config.WEIGHT_FE_VEHICLE
             
-            if is_feasible:
-                new_fe_primary = new_fe_dist if config.PRIMARY_OBJECTIVE == "DISTANCE" else new_fe_time
-                primary_increase = getattr(temp_new_se, primary_route_attr) + new_fe_primary
-                objective_increase = config.WEIGHT_PRIMARY * primary_increase
-                if config.OPTIMIZE_VEHICLE_COUNT: 
-                    objective_increase += config.WEIGHT_SE_VEHICLE + config.WEIGHT_FE_VEHICLE
-                
-                option = {
-                    'objective_increase': objective_increase, 
-                    'type': 'create_new_se_new_fe', 
-                    'new_satellite': satellite
-                }
-                add_option_to_heap(objective_increase, option)
+            option = {
+                'objective_increase': objective_increase, 
+                'type': 'create_new_se_new_fe', 
+                'new_satellite': satellite
+            }
+            add_option_to_heap(objective_increase, option)
 
         # 3. New SE + Expand FE
+        sat_bit = 1 << problem.satellite_index[satellite.id]
         for fe_route in solution.fe_routes:
-            if sum(r.total_load_delivery for r in fe_route.serviced_se_routes) + temp_new_se.total_load_delivery > problem.fe_vehicle_capacity + 1e-6: 
+            if fe_route.total_load_delivery + temp_new_se.total_load_delivery > problem.fe_vehicle_capacity + 1e-6: 
                 continue
             
-            fe_memento_expand = fe_route.backup()
-            se_mementos_expand = {se: se.backup() for se in fe_route.serviced_se_routes}
+            # Chênh lệch chi phí FE tra bảng theo tập vệ tinh (không đọc chi phí của route thật, vì đọc sẽ kích hoạt
+            # đồng bộ FE): chỉ mô phỏng lịch FE khi phương án có thể vào top-k
+            current_tour = problem.get_fe_tour(fe_route.satellite_mask)
+            expanded_tour = problem.get_fe_tour(fe_route.satellite_mask | sat_bit)
+            delta_fe_primary = getattr(expanded_tour, primary_route_attr) - getattr(current_tour, primary_route_attr)
+            objective_increase = config.WEIGHT_PRIMARY * (getattr(temp_new_se, primary_route_attr) + delta_fe_primary)
+            if config.OPTIMIZE_VEHICLE_COUNT: 
+                objective_increase += config.WEIGHT_SE_VEHICLE
+            if not can_enter_heap(objective_increase): continue
             
-            try:
-                fe_route.add_serviced_se_route(temp_new_se)
-                is_feasible_expand, _, _ = _recalculate_fe_route_and_check_feasibility(fe_route, problem)
-                
-                if is_feasible_expand:
-                    delta_fe_primary = getattr(fe_route, primary_route_attr) - getattr(fe_memento_expand, primary_route_attr)
-                    primary_increase = getattr(temp_new_se, primary_route_attr) + delta_fe_primary
-                    
-                    objective_increase = config.WEIGHT_PRIMARY * primary_increase
-                    if config.OPTIMIZE_VEHICLE_COUNT: 
-                        objective_increase += config.WEIGHT_SE_VEHICLE
-                    
-                    option = {
-                        'objective_increase': objective_increase, 
-                        'type': 'create_new_se_expand_fe', 
-                        'new_satellite': satellite, 
-                        'fe_route': fe_route
-                    }
-                    add_option_to_heap(objective_increase, option)
-            finally:
-                fe_route.restore(fe_memento_expand)
-                for se, memento in se_mementos_expand.items(): se.restore(memento)
+            is_feasible_expand = evaluate_new_se_insertion(fe_route, temp_new_se)
+            if is_feasible_expand:
+                option = {
+                    'objective_increase': objective_increase, 
+                    'type': 'create_new_se_expand_fe', 
+                    'new_satellite': satellite, 
+                    'fe_route': fe_route
+                }
+                add_option_to_heap(objective_increase, option)
 
     sorted_options = sorted([opt for cost, count, opt in best_options_heap], key=lambda x: x['objective_increase'])
     return sorted_options
@@ -0,0 +1,170 @@
+# logic_schedule.py
+from array import array
+from collections import namedtuple
+from enum import IntEnum
+from itertools import chain, islice
+
+import numpy as np
+
+# Với route ngắn, vòng lặp Python nhanh hơn: mỗi lần gọi NumPy tốn chi phí cố định vài micro giây
+VECTORIZE_MIN_NODES = 24
+
+SEScheduleArrays = namedtuple('SEScheduleArrays', ['ready', 'due', 'step', 'offset', 'release'])
+SEScheduleResult = namedtuple('SEScheduleResult', ['start_times', 'waiting_times', 'forward_slacks', 'feasible'])
+
+
+class SETimeProfile(namedtuple('SETimeProfile', ['latest_start_time', 'duration', 'release_time', 'route_deadline'])):
+    """
+    Hồ sơ thời gian của một dãy node SE, chỉ phụ thuộc dãy node (tính lại khi dãy đổi).
+    Xuất phát lúc t: khả thi khi t <= latest_start_time, về vệ tinh lúc duration + max(t, release_time).
+    latest_start_time = -inf nếu không thời điểm xuất phát nào thỏa time window.
+    """
+    __slots__ = ()
+
+    def is_feasible_start(self, start_time: float) -> bool:
+        return start_time <= self.latest_start_time + 1e-6
+
+    def finish_time(self, start_time: float) -> float:
+        return self.duration + max(start_time, self.release_time)
+
+
+class FEActivity(IntEnum):
+    DEPART_DEPOT = 0
+    UNLOAD_DELIV = 1
+    LOAD_PICKUP = 2
+    ARRIVE_DEPOT = 3
+
+
+FEEvent = namedtuple('FEEvent', ['activity', 'node_id', 'load_change', 'load_after',
+                                 'arrival_time', 'start_svc_time', 'departure_time'])
+
+
+class FESchedule:
+    """
+    Lịch FE dạng cột: sự kiện k gồm activity[k] (FEActivity), node_id[k], load_change[k], load_after[k],
+    arrival_time[k], start_svc_time[k], departure_time[k]. Thứ tự: DEPART_DEPOT, rồi UNLOAD_DELIV / LOAD_PICKUP
+    cho từng vệ tinh (dòng 1 + 2k, 2 + 2k), cuối cùng ARRIVE_DEPOT.
+    Các cột là array kiểu cố định nên ghi đè tại chỗ được; sao chép chỉ là copy từng buffer.
+    Duyệt / chỉ số trả về FEEvent (chỉ dùng cho báo cáo, vẽ hình).
+    """
+    __slots__ = ('activity', 'node_id', 'load_change', 'load_after', 'arrival_time', 'start_svc_time', 'departure_time')
+
+    def __init__(self):
+        self.activity, self.node_id = array('b'), array('i')
+        self.load_change, self.load_after = array('d'), array('d')
+        self.arrival_time, self.start_svc_time, self.departure_time = array('d'), array('d'), array('d')
+
+    def __len__(self) -> int: return len(self.activity)
+
+    def __getitem__(self, k: int) -> FEEvent:
+        return FEEvent(FEActivity(self.activity[k]), self.node_id[k], self.load_change[k], self.load_after[k],
+                       self.arrival_time[k], self.start_svc_time[k], self.departure_time[k])
+
+    def __iter__(self):
+        return (self[k] for k in range(len(self)))
+
+    def put(self, row: int, activity: FEActivity, node_id: int, load_change: float, load_after: float,
+            arrival_time: float, start_svc_time: float, departure_time: float):
+        """ Ghi sự kiện vào dòng row (row == len(self) thì nối thêm). """
+        if row == len(self.activity):
+            self.activity.append(activity); self.node_id.append(node_id)
+            self.load_change.append(load_change); self.load_after.append(load_after)
+            self.arrival_time.append(arrival_time); self.start_svc_time.append(start_svc_time)
+            self.departure_time.append(departure_time)
+        else:
+            self.activity[row] = activity; self.node_id[row] = node_id
+            self.load_change[row] = load_change; self.load_after[row] = load_after
+            self.arrival_time[row] = arrival_time; self.start_svc_time[row] = start_svc_time
+            self.departure_time[row] = departure_time
+
+    def clear(self):
+        for name in self.__slots__: del getattr(self, name)[:]
+
+    def copy(self) -> "FESchedule":
+        clone = FESchedule.__new__(FESchedule)
+        for name in self.__slots__: setattr(clone, name, getattr(self, name)[:])
+        return clone
+
+    def path(self):
+        """ Dãy node FE đi qua (gộp các sự kiện liên tiếp tại cùng một node). """
+        path_nodes = []
+        for node_id in self.node_id:
+            if not path_nodes or node_id != path_nodes[-1]: path_nodes.append(node_id)
+        return path_nodes
+
+
+def build_se_schedule_arrays(problem, nodes_id) -> SEScheduleArrays:
+    """
+    Dữ liệu tĩnh (không phụ thuộc thời điểm xuất phát) của một dãy node SE.
+    step[k] = service(k-1) + travel(k-1, k); offset = tổng tích lũy của step (offset[0] = 0);
+    release[k] = max_{1<=j<=k}(ready[j] - offset[j]) (release[0] = -inf).
+    """
+    nodes = np.asarray(nodes_id, dtype=np.int64)
+    arrays = problem.node_arrays
+    base = arrays['base_id'][nodes]
+    ready, due = arrays['ready_time'][nodes], arrays['due_time'][nodes]
+    step = arrays['service_time'][base[:-1]] + np.asarray(problem.get_travel_times(base[:-1], base[1:]), dtype=np.float64)
+    offset = np.zeros(len(nodes))
+    np.cumsum(step, out=offset[1:])
+    release = np.full(len(nodes), -np.inf)
+    if len(nodes) > 1:
+        release[1:] = np.maximum.accumulate(ready[1:] - offset[1:])
+    return SEScheduleArrays(ready, due, step, offset, release)
+
+
+def evaluate_se_schedule(arrays: SEScheduleArrays, start_time: float) -> SEScheduleResult:
+    """
+    Lịch SE theo dạng max-plus: start[k] = max(ready[k], start[k-1] + step[k]) = offset[k] + max(start[0], release[k]),
+    nên cả dãy là một phép quét tiền tố thay vì vòng lặp qua từng node.
+    Forward slack (Savelsbergh) F[k] = min_{j>=k}(due[j] - start[j] + W(k, j]) là một cummin ngược trên tổng chờ tích lũy.
+    """
+    starts = arrays.offset + np.maximum(float(start_time), arrays.release)
+    waits = np.zeros_like(starts)
+    waits[1:] = starts[1:] - (starts[:-1] + arrays.step)
+    cum_wait = np.cumsum(waits)
+    slacks = np.minimum.accumulate((arrays.due - starts + cum_wait)[::-1])[::-1] - cum_wait
+    feasible = not (starts > arrays.due + 1e-6).any()
+    return SEScheduleResult(starts, waits, slacks, feasible)
+
+
+def calculate_se_time_profile(problem, nodes_id) -> SETimeProfile:
+    """
+    start[k] = offset[k] + max(t, release[k]) <= due[k] với mọi k
+    <=> t <= min_k(due[k] - offset[k]) và release[k] <= due[k] - offset[k] với mọi k (không phụ thuộc t).
+    """
+    deadline = problem.deadline
+    route_deadline = min((deadline[cid] for cid in nodes_id[1:-1]), default=float('inf'))
+    if len(nodes_id) >= VECTORIZE_MIN_NODES:
+        arrays = build_se_schedule_arrays(problem, nodes_id)
+        start_bounds = arrays.due - arrays.offset
+        latest = float(start_bounds.min()) if (arrays.release <= start_bounds + 1e-6).all() else float('-inf')
+        return SETimeProfile(latest, float(arrays.offset[-1]), float(arrays.release[-1]), route_deadline)
+    return _scan_se_time_profile(problem, nodes_id, route_deadline)
+
+
+def calculate_se_insertion_time_profile(problem, nodes_id, cust_id: int, pos: int) -> SETimeProfile:
+    """ Hồ sơ thời gian của dãy nodes_id khi chèn cust_id vào vị trí pos, duyệt trực tiếp mà không dựng dãy mới. """
+    deadline = problem.deadline
+    route_deadline = min(min((deadline[cid] for cid in islice(nodes_id, 1, len(nodes_id) - 1)), default=float('inf')),
+                         deadline[cust_id])
+    sequence = chain(islice(nodes_id, pos), (cust_id,), islice(nodes_id, pos, None))
+    return _scan_se_time_profile(problem, sequence, route_deadline)
+
+
+def _scan_se_time_profile(problem, node_ids, route_deadline: float) -> SETimeProfile:
+    """ Vòng lặp vô hướng của calculate_se_time_profile trên một dãy node bất kỳ (kể cả iterator). """
+    base_id, ready_time, due_time, service_time = problem.base_id, problem.ready_time, problem.due_time, problem.service_time
+    offset, release, latest = 0.0, float('-inf'), float('inf')
+    node_iter = iter(node_ids)
+    prev_base = base_id[next(node_iter)]
+    for node_id in node_iter:
+        curr_base = base_id[node_id]
+        offset += service_time[prev_base] + problem.get_travel_time(prev_base, curr_base)
+        release = max(release, ready_time[curr_base] - offset)
+        start_bound = due_time[curr_base] - offset
+        if release > start_bound + 1e-6:
+            latest = float('-inf')
+        elif start_bound < latest:
+            latest = start_bound
+        prev_base = curr_base
+    return SETimeProfile(latest, offset, release, route_deadline)
@@ -102,6 +102,8 @@ def main():
     # 5. Report & Visualize
     print_solution_details(final_solution, execution_time=end_time - start_time)
     validate_solution_feasibility(final_solution)
+    if config.DISTANCE_STORAGE == "matrix_free":
+        print(f"Distance row cache: {problem.distances.cache_info()}")
     
     print("\nGenerating plots...")
     plot_solution_visualization(final_solution, save_dir=run_dir)
@@ -1,10 +1,15 @@
 # model_solution.py
 from __future__ import annotations
 import copy
-from typing import Dict, List, Set, Union, TYPE_CHECKING
+import heapq
+import itertools
+from array import array
+from typing import Dict, List, Optional, Set, Union, TYPE_CHECKING
 
 import config
 from model_problem import ProblemInstance, Customer, Satellite
+from logic_schedule import (VECTORIZE_MIN_NODES, SEScheduleResult, SETimeProfile, FEActivity, FESchedule,
+                            build_se_schedule_arrays, evaluate_se_schedule, calculate_se_time_profile)
 
 # ==============================================================================
 # 1. CLASSES FOR TRANSACTION & MEMENTO
@@ -13,17 +18,30 @@ from model_problem import ProblemInstance, Customer, Satellite
 class RouteMemento:
     def __init__(self, route: Union["SERoute", "FERoute"]):
         if hasattr(route, 'nodes_id'): # SERoute
-            self.nodes_id = route.nodes_id.copy()
+            # FE đang chờ đồng bộ quyết định thời điểm xuất phát của route: đồng bộ trước khi chụp lịch
+            route._sync_serving_fe()
+            self.nodes_id = route.nodes_id[:]
             self.total_dist = route.total_dist
             self.total_travel_time = route.total_travel_time
             self.total_load_pickup = route.total_load_pickup
             self.total_load_delivery = route.total_load_delivery
-            self.service_start_times = route.service_start_times.copy()
-            self.waiting_times = route.waiting_times.copy()
-            self.forward_time_slacks = route.forward_time_slacks.copy()
+            # Bản sao lịch thô: lịch đang chờ đồng bộ (pending_start_time) được khôi phục nguyên trạng
+            self.service_start_times = route._service_start_times[:]
+            self.waiting_times = route._waiting_times[:]
+            self.forward_time_slacks = route._forward_time_slacks[:]
+            self.prefix_max_load = route.prefix_max_load
+            self.suffix_max_load = route.suffix_max_load
+            self.time_profile = route.time_profile
+            self.pending_start_time = route.pending_start_time
             self.serving_fe_routes = route.serving_fe_routes.copy()
         elif hasattr(route, 'schedule'): # FERoute
             self.serviced_se_routes = route.serviced_se_routes.copy()
+            self.se_routes_by_satellite = {sat_id: bucket.copy() for sat_id, bucket in route.se_routes_by_satellite.items()}
+            self.satellite_mask = route.satellite_mask
+            self.total_load_delivery = route.total_load_delivery
+            self.total_load_pickup = route.total_load_pickup
+            self.deadline_counts = route._deadline_counts.copy()
+            self.deadline_heap = route._deadline_heap[:]
             self.schedule = route.schedule.copy()
             self.total_dist = route.total_dist
             self.total_time = route.total_time
@@ -53,40 +71,256 @@ class ChangeContext:
         for route in self.removed_routes:
             if isinstance(route, SERoute):
                 if route not in self.solution.se_routes: self.solution.se_routes.append(route)
+                self.solution.map_route_customers(route)
             elif isinstance(route, FERoute):
                 if route not in self.solution.fe_routes: self.solution.fe_routes.append(route)
 
         for route in self.newly_created_routes:
             if isinstance(route, SERoute):
                 if route in self.solution.se_routes: self.solution.se_routes.remove(route)
+                self.solution.unmap_route_customers(route)
             elif isinstance(route, FERoute):
                 if route in self.solution.fe_routes: self.solution.fe_routes.remove(route)
 
+        # Route mới tạo có thể đã được backup (khi chèn tiếp vào nó): khôi phục nhưng không đưa lại vào bản đồ khách hàng
+        discarded = set(self.newly_created_routes)
         for route, memento in self.affected_routes_mementos.items():
-            route.restore(memento)
-        
-        self.solution.update_customer_map()
+            if isinstance(route, SERoute):
+                self.solution.unmap_route_customers(route)
+                route.restore(memento)
+                if route not in discarded: self.solution.map_route_customers(route)
+            else:
+                route.restore(memento)
 
 # ==============================================================================
 # 2. CLASSES FOR ROUTES & SOLUTION
 # ==============================================================================
 
 class FERoute:
+    """
+    Lịch FE và các tổng chi phí được đồng bộ lười: thay đổi SE route được phục vụ (chèn / xóa khách, link / unlink)
+    chỉ đánh dấu route là dirty, synchronize() chạy một lần khi có ai đọc schedule, chi phí hoặc lịch của SE route.
+    Các sự kiện UNLOAD_DELIV / LOAD_PICKUP của từng vệ tinh (dòng 1 + 2k, 2 + 2k của schedule) là checkpoint
+    để đồng bộ lại từ vệ tinh đầu tiên có SE route thay đổi (_changed_satellites).
+    """
+    __slots__ = ('problem', 'serviced_se_routes', 'se_routes_by_satellite', 'satellite_mask',
+                 'total_load_delivery', 'total_load_pickup', '_deadline_counts', '_deadline_heap', '_dirty',
+                 '_changed_satellites', '_full_resync', '_feasible', '_schedule', '_scratch', '_total_dist', '_total_time', '_total_travel_time', '_route_deadline')
+
     def __init__(self, problem: "ProblemInstance"):
         self.problem = problem
         self.serviced_se_routes: Set[SERoute] = set()
-        self.schedule: List[Dict] = []
-        self.total_dist: float = 0.0
-        self.total_time: float = 0.0
-        self.total_travel_time: float = 0.0
-        self.route_deadline: float = float('inf')
+        # SE route nhóm theo vệ tinh (chỉ các vệ tinh có SE route) và bitmask của tập vệ tinh đó, cập nhật khi link / unlink
+        self.se_routes_by_satellite: Dict[int, Set[SERoute]] = {}
+        self.satellite_mask: int = 0
+        # Tổng tải của các SE route được phục vụ và deadline của khách hàng trên chúng (bộ đếm + heap xóa lười),
+        # cập nhật khi link / unlink và khi SE route chèn / xóa khách
+        self.total_load_delivery: float = 0.0
+        self.total_load_pickup: float = 0.0
+        self._deadline_counts: Dict[float, int] = {}
+        self._deadline_heap: List[float] = []
+        self._dirty: bool = False
+        self._changed_satellites: Set[int] = set()
+        # Lịch hiện có không dùng làm checkpoint được (chưa đồng bộ trọn vẹn, hoặc tập vệ tinh đã đổi)
+        self._full_resync: bool = True
+        # Kết quả lần đồng bộ gần nhất (xem is_feasible)
+        self._feasible: bool = True
+        self._schedule = FESchedule()
+        # Bộ đệm để mô phỏng lịch mới; chỉ hoán đổi với _schedule khi đồng bộ khả thi
+        self._scratch = FESchedule()
+        self._total_dist: float = 0.0
+        self._total_time: float = 0.0
+        self._total_travel_time: float = 0.0
+        self._route_deadline: float = float('inf')
+
+    @property
+    def schedule(self) -> FESchedule:
+        self.flush(); return self._schedule
+
+    @property
+    def total_dist(self) -> float:
+        self.flush(); return self._total_dist
+
+    @property
+    def total_time(self) -> float:
+        self.flush(); return self._total_time
+
+    @property
+    def total_travel_time(self) -> float:
+        self.flush(); return self._total_travel_time
+
+    @property
+    def route_deadline(self) -> float:
+        self.flush(); return self._route_deadline
+
+    @property
+    def is_feasible(self) -> bool:
+        """ False khi lịch FE-SE hiện tại không đồng bộ được; khi đó schedule và total_time là của lần khả thi trước. """
+        self.flush(); return self._feasible
+
+    def mark_dirty(self, satellite_id: Optional[int] = None):
+        """ satellite_id: vệ tinh có SE route thay đổi; None khi phải đồng bộ lại toàn bộ. """
+        self._dirty = True
+        if satellite_id is None: self._full_resync = True
+        else: self._changed_satellites.add(satellite_id)
+
+    def flush(self):
+        if self._dirty: self.synchronize()
+
+    def tightest_deadline(self) -> float:
+        """ Deadline nhỏ nhất của các khách hàng đang được phục vụ, O(1) khấu hao. """
+        heap, counts = self._deadline_heap, self._deadline_counts
+        while heap and heap[0] not in counts:
+            heapq.heappop(heap)
+        return heap[0] if heap else float('inf')
+
+    def account_customer(self, customer: "Customer", sign: int):
+        """ Cộng (sign = 1) hoặc trừ (sign = -1) tải và deadline của một khách hàng trên SE route được phục vụ. """
+        if self.problem.is_delivery[customer.id]: self.total_load_delivery += sign * customer.demand
+        else: self.total_load_pickup += sign * customer.demand
+        self._account_deadline(self.problem.deadline[customer.id], sign)
+
+    def _account_deadline(self, deadline: float, sign: int):
+        if deadline == float('inf'): return
+        counts = self._deadline_counts
+        count = counts.get(deadline, 0) + sign
+        if count > 0:
+            if count == 1 and sign > 0: heapq.heappush(self._deadline_heap, deadline)
+            counts[deadline] = count
+        else:
+            del counts[deadline]
+
+    def synchronize(self):
+        """
+        Tính lại lịch FE (Static Sorting & Hard Blocking), đặt thời điểm xuất phát cho các SE route và kiểm tra khả thi.
+        Trả về (is_feasible, total_dist, total_travel_time); không khả thi thì (False, None, None).
+        Khi lịch cũ còn dùng được: các vệ tinh trước vệ tinh thay đổi đầu tiên giữ nguyên thời gian, và từ vệ tinh
+        (sau mọi vệ tinh thay đổi) có thời điểm FE đến trùng checkpoint trở đi thời gian cũng không đổi;
+        ở các đoạn đó chỉ cập nhật tải trọng, theo đúng thứ tự cộng trừ như khi tính lại toàn bộ.
+        Lịch mới được ghi vào bộ đệm _scratch, thời điểm xuất phát của SE route được gom lại; cả hai chỉ được áp dụng
+        khi khả thi. Không khả thi: xem _record_infeasible.
+        """
+        self._dirty = False
+        changed_satellites, self._changed_satellites = self._changed_satellites, set()
+        full_resync, self._full_resync = self._full_resync, True
+        problem = self.problem
+        old_schedule, schedule = self._schedule, self._scratch
+        schedule.clear()
+        if not self.serviced_se_routes:
+            self._schedule, self._scratch = schedule, old_schedule
+            self._full_resync, self._feasible = False, True
+            self.calculate_route_properties()
+            return True, 0.0, 0.0
+            
+        depot = problem.depot
+        
+        # 1. Tải trọng ban đầu (tổng duy trì tăng dần)
+        initial_delivery_load = self.total_load_delivery
+        
+        # 2. Kiểm tra tải trọng ngay lập tức
+        if initial_delivery_load > problem.fe_vehicle_capacity + 1e-6:
+            return self._record_infeasible()
+
+        # --- STATIC SORTING: Luôn đi từ vệ tinh gần Depot nhất (thứ tự tra bảng theo tập vệ tinh) ---
+        sats_list = problem.get_fe_tour(self.satellite_mask).satellites
+        se_routes_by_satellite = self.se_routes_by_satellite
+        
+        # Đoạn [first_changed, last_changed] luôn mô phỏng lại; ngoài đoạn đó chép checkpoint của lịch cũ
+        first_changed, last_changed = 0, len(sats_list) - 1
+        if not full_resync:
+            changed_positions = [k for k, satellite in enumerate(sats_list) if satellite.id in changed_satellites]
+            if changed_positions:
+                first_changed, last_changed = changed_positions[0], changed_positions[-1]
+            else:
+                first_changed, last_changed = len(sats_list), -1
+        old_load_change, old_arrival, old_departure = old_schedule.load_change, old_schedule.arrival_time, old_schedule.departure_time
+        
+        current_time = 0.0
+        current_load = initial_delivery_load
+        schedule.put(0, FEActivity.DEPART_DEPOT, depot.id, current_load, current_load, 0.0, 0.0, 0.0)
+        
+        last_node_id = depot.id
+        reuse_times = first_changed > 0
+        se_start_times = []
+
+        for k, satellite in enumerate(sats_list):
+            unload_row, pickup_row = 1 + 2 * k, 2 + 2 * k
+            if not (reuse_times and k < first_changed):
+                arrival_at_sat = current_time + problem.get_travel_time(last_node_id, satellite.id)
+                # Sau vệ tinh thay đổi cuối cùng, FE đến đúng như cũ -> phần còn lại của lịch không đổi thời gian
+                reuse_times = not full_resync and k > last_changed and arrival_at_sat == old_arrival[unload_row]
+            
+            if reuse_times:
+                arrival_at_sat = old_arrival[unload_row]
+                current_load += old_load_change[unload_row]
+                schedule.put(unload_row, FEActivity.UNLOAD_DELIV, satellite.id, old_load_change[unload_row], current_load,
+                             arrival_at_sat, arrival_at_sat, arrival_at_sat)
+                latest_se_finish, current_time = old_arrival[pickup_row], old_departure[pickup_row]
+                current_load += old_load_change[pickup_row]
+                schedule.put(pickup_row, FEActivity.LOAD_PICKUP, satellite.id, old_load_change[pickup_row], current_load,
+                             latest_se_finish, latest_se_finish, current_time)
+                last_node_id = satellite.id
+                continue
+            
+            se_routes_at_sat = se_routes_by_satellite[satellite.id]
+            del_load_at_sat = sum(r.total_load_delivery for r in se_routes_at_sat)
+            
+            # Unload Delivery
+            current_load -= del_load_at_sat
+            schedule.put(unload_row, FEActivity.UNLOAD_DELIV, satellite.id, -del_load_at_sat, current_load,
+                         arrival_at_sat, arrival_at_sat, arrival_at_sat)
+            
+            latest_se_finish = 0
+            for se_route in se_routes_at_sat:
+                # --- DOWNSTREAM SYNC: FE đến -> SE được phép chạy ---
+                # Khả thi và thời điểm về vệ tinh tra từ hồ sơ thời gian của SE, O(1); lịch chi tiết cập nhật khi cần đọc
+                profile = se_route.time_profile
+                if not profile.is_feasible_start(arrival_at_sat):
+                    return self._record_infeasible()
+                se_start_times.append((se_route, arrival_at_sat))
+                latest_se_finish = max(latest_se_finish, profile.finish_time(arrival_at_sat))
+            
+            pickup_load_at_sat = sum(r.total_load_pickup for r in se_routes_at_sat)
+            
+            # --- UPSTREAM SYNC (HARD BLOCKING): FE phải đợi SE chậm nhất ---
+            departure_from_sat = latest_se_finish
+            
+            # Load Pickup
+            current_load += pickup_load_at_sat
+            schedule.put(pickup_row, FEActivity.LOAD_PICKUP, satellite.id, pickup_load_at_sat, current_load,
+                         latest_se_finish, latest_se_finish, departure_from_sat)
+            
+            current_time = departure_from_sat
+            last_node_id = satellite.id
+
+        arrival_at_depot = current_time + problem.get_travel_time(last_node_id, depot.id)
+        # Lịch đã đi hết mọi SE route: deadline hiệu lực là deadline nhỏ nhất của chúng
+        if arrival_at_depot > self.tightest_deadline() + 1e-6:
+            return self._record_infeasible()
+        schedule.put(1 + 2 * len(sats_list), FEActivity.ARRIVE_DEPOT, depot.id, -current_load, 0,
+                     arrival_at_depot, arrival_at_depot, arrival_at_depot)
+        
+        for se_route, start_time in se_start_times: se_route.set_start_time(start_time)
+        self._schedule, self._scratch = schedule, old_schedule
+        self._full_resync, self._feasible = False, True
+        self.calculate_route_properties()
+        return True, self._total_dist, self._total_travel_time
+
+    def _record_infeasible(self):
+        """
+        Đồng bộ thất bại: route vẫn dirty (lần đọc kế tiếp thử lại, tính lại toàn bộ) và is_feasible là False.
+        Lịch FE và thời điểm xuất phát của SE route giữ nguyên lần khả thi trước; chi phí và deadline, vốn chỉ phụ thuộc
+        tập vệ tinh / khách hàng, được cập nhật theo trạng thái hiện tại.
+        """
+        self._dirty, self._feasible = True, False
+        tour = self.problem.get_fe_tour(self.satellite_mask)
+        self._total_dist, self._total_travel_time = tour.total_dist, tour.total_travel_time
+        self._route_deadline = self.tightest_deadline()
+        return False, None, None
 
     def __repr__(self) -> str:
         if not self.schedule: return "--- Empty FERoute ---"
-        path_nodes = [self.schedule[0]['node_id']]
-        for event in self.schedule[1:]:
-            if event['node_id'] != path_nodes[-1]: path_nodes.append(event['node_id'])
-        path_str = " -> ".join(map(str, path_nodes))
+        path_str = " -> ".join(map(str, self.schedule.path()))
         deadline_str = f"Route Deadline: {self.route_deadline:.2f}" if self.route_deadline != float('inf') else "No Deadline"
         header_str = (f"--- FERoute (Cost: {self.total_dist:.2f}, Time: {self.total_time:.2f}) --- {deadline_str}")
         lines = [header_str, f"Path: {path_str}"]
@@ -94,81 +328,262 @@ class FERoute:
         lines.append(tbl_header)
         lines.append("  " + "-" * len(tbl_header))
         for event in self.schedule:
-            lines.append(f"  {event['activity']:<15}| {event['node_id']:<6}| {event['load_after']:>12.2f}| "
-                         f"{event['arrival_time']:>9.2f}| {event['departure_time']:>11.2f}")
+            lines.append(f"  {event.activity.name:<15}| {event.node_id:<6}| {event.load_after:>12.2f}| "
+                         f"{event.arrival_time:>9.2f}| {event.departure_time:>11.2f}")
         return "\n".join(lines)
 
-    def add_serviced_se_route(self, se_route: "SERoute"): self.serviced_se_routes.add(se_route)
-    def remove_serviced_se_route(self, se_route: "SERoute"): self.serviced_se_routes.discard(se_route)
+    def add_serviced_se_route(self, se_route: "SERoute"):
+        if se_route in self.serviced_se_routes: return
+        self.serviced_se_routes.add(se_route)
+        self.total_load_delivery += se_route.total_load_delivery
+        self.total_load_pickup += se_route.total_load_pickup
+        deadline = self.problem.deadline
+        for cust_id in se_route.customers.ids(): self._account_deadline(deadline[cust_id], 1)
+        sat_id = se_route.satellite.id
+        bucket = self.se_routes_by_satellite.get(sat_id)
+        if bucket is None:
+            bucket = self.se_routes_by_satellite[sat_id] = set()
+            self.satellite_mask |= 1 << self.problem.satellite_index[sat_id]
+            self.mark_dirty()
+        else:
+            self.mark_dirty(sat_id)
+        bucket.add(se_route)
+
+    def remove_serviced_se_route(self, se_route: "SERoute"):
+        if se_route not in self.serviced_se_routes: return
+        self.serviced_se_routes.discard(se_route)
+        if self.serviced_se_routes:
+            self.total_load_delivery -= se_route.total_load_delivery
+            self.total_load_pickup -= se_route.total_load_pickup
+            deadline = self.problem.deadline
+            for cust_id in se_route.customers.ids(): self._account_deadline(deadline[cust_id], -1)
+        else:
+            # Không còn SE route: đặt lại hẳn về 0 để sai số làm tròn không tích lũy
+            self.total_load_delivery, self.total_load_pickup = 0.0, 0.0
+            self._deadline_counts, self._deadline_heap = {}, []
+        sat_id = se_route.satellite.id
+        bucket = self.se_routes_by_satellite[sat_id]
+        bucket.discard(se_route)
+        if not bucket:
+            del self.se_routes_by_satellite[sat_id]
+            self.satellite_mask &= ~(1 << self.problem.satellite_index[sat_id])
+            self.mark_dirty()
+        else:
+            self.mark_dirty(sat_id)
     
     def calculate_route_properties(self):
-        if len(self.schedule) < 2: 
-            self.total_dist, self.total_time, self.total_travel_time, self.route_deadline = 0.0, 0.0, 0.0, float('inf')
+        schedule = self._schedule
+        if len(schedule) < 2: 
+            self._total_dist, self._total_time, self._total_travel_time, self._route_deadline = 0.0, 0.0, 0.0, float('inf')
             return
-        self.total_dist = 0.0
-        self.total_travel_time = 0.0
-        path_nodes = [self.schedule[0]['node_id']]
-        [path_nodes.append(e['node_id']) for e in self.schedule[1:] if e['node_id'] != path_nodes[-1]]
-        for i in range(len(path_nodes) - 1): 
-            self.total_dist += self.problem.get_distance(path_nodes[i], path_nodes[i+1])
-            self.total_travel_time += self.problem.get_travel_time(path_nodes[i], path_nodes[i+1])
-        self.total_time = self.schedule[-1]['arrival_time'] - self.schedule[0]['departure_time']
-        deadlines = {c.deadline for se in self.serviced_se_routes for c in se.get_customers() if hasattr(c, 'deadline')}
-        self.route_deadline = min(deadlines) if deadlines else float('inf')
+        # Chi phí FE chỉ phụ thuộc tập vệ tinh được ghé: tra bảng theo bitmask
+        tour = self.problem.get_fe_tour(self.satellite_mask)
+        self._total_dist, self._total_travel_time = tour.total_dist, tour.total_travel_time
+        self._total_time = schedule.arrival_time[-1] - schedule.departure_time[0]
+        self._route_deadline = self.tightest_deadline()
 
     def backup(self) -> RouteMemento: return RouteMemento(self)
     def restore(self, memento: RouteMemento):
         self.serviced_se_routes = memento.serviced_se_routes
-        self.schedule = memento.schedule
-        self.total_dist = memento.total_dist
-        self.total_time = memento.total_time
-        self.total_travel_time = memento.total_travel_time
-        self.route_deadline = memento.route_deadline
+        self.se_routes_by_satellite = memento.se_routes_by_satellite
+        self.satellite_mask = memento.satellite_mask
+        self.total_load_delivery = memento.total_load_delivery
+        self.total_load_pickup = memento.total_load_pickup
+        self._deadline_counts = memento.deadline_counts
+        self._deadline_heap = memento.deadline_heap
+        # SE route không được backup cùng FE có thể giữ thời điểm xuất phát của lần đồng bộ bị hủy:
+        # đồng bộ lại toàn bộ ở lần đọc kế tiếp để đặt lại chúng (lịch khôi phục không dùng làm checkpoint)
+        self._dirty = True
+        self._changed_satellites = set()
+        self._full_resync = True
+        self._schedule = memento.schedule
+        self._total_dist = memento.total_dist
+        self._total_time = memento.total_time
+        self._total_travel_time = memento.total_travel_time
+        self._route_deadline = memento.route_deadline
+
+
+class SERouteCustomers:
+    """ View (không cấp phát list) các khách hàng của một SE route, theo thứ tự trên route. """
+    __slots__ = ('route',)
+
+    def __init__(self, route: "SERoute"): self.route = route
+    def __len__(self) -> int: return len(self.route.nodes_id) - 2
+    def __iter__(self):
+        node_objects, nodes_id = self.route.problem.node_objects, self.route.nodes_id
+        return (node_objects[nid] for nid in itertools.islice(nodes_id, 1, len(nodes_id) - 1))
+    def __contains__(self, customer: "Customer") -> bool:
+        return self.route.position_of(customer.id) is not None
+    def ids(self):
+        nodes_id = self.route.nodes_id
+        return itertools.islice(nodes_id, 1, len(nodes_id) - 1)
 
 
 class SERoute:
+    """
+    Dãy node (array('i')) và lịch theo vị trí (array('d')): service_start_times[i], waiting_times[i],
+    forward_time_slacks[i] ứng với node nodes_id[i]. Dùng position_of để tra vị trí của một node (O(1)).
+    """
+    __slots__ = ('problem', 'satellite', 'nodes_id', '_positions', 'serving_fe_routes', 'customers',
+                 '_service_start_times', '_waiting_times', '_forward_time_slacks', 'pending_start_time',
+                 'total_dist', 'total_travel_time', 'total_load_pickup', 'total_load_delivery',
+                 'prefix_max_load', 'suffix_max_load', 'time_profile')
+
     def __init__(self, satellite: "Satellite", problem: "ProblemInstance", start_time: float = 0.0):
         self.problem = problem
         self.satellite = satellite
-        self.nodes_id: List[int] = [satellite.dist_id, satellite.coll_id]
+        self.nodes_id = array('i', (satellite.dist_id, satellite.coll_id))
+        # Chỉ mục node -> vị trí; cập nhật khi chèn / xóa, dựng lại khi cần nếu là None (sau restore)
+        self._positions: Optional[Dict[int, int]] = None
         self.serving_fe_routes: Set[FERoute] = set()
-        self.service_start_times: Dict[int, float] = {satellite.dist_id: start_time}
-        self.waiting_times: Dict[int, float] = {satellite.dist_id: 0.0}
-        self.forward_time_slacks: Dict[int, float] = {satellite.dist_id: float('inf')}
+        self.customers = SERouteCustomers(self)
+        self._service_start_times = array('d', (start_time, start_time))
+        self._waiting_times = array('d', (0.0, 0.0))
+        self._forward_time_slacks = array('d', (float('inf'), float('inf')))
+        # Thời điểm xuất phát mới chưa áp vào lịch chi tiết (lịch được đồng bộ khi có ai đọc)
+        self.pending_start_time: Optional[float] = None
         self.total_dist: float = 0.0
         self.total_travel_time: float = 0.0
         self.total_load_pickup: float = 0.0
         self.total_load_delivery: float = 0.0
+        self.prefix_max_load = array('d')
+        self.suffix_max_load = array('d')
+        self.time_profile: SETimeProfile = None
+        self.update_load_profile()
+        self.update_time_profile()
         self.calculate_full_schedule_and_slacks()
 
+    @property
+    def service_start_times(self) -> array:
+        self._sync_serving_fe(); self.sync_schedule(); return self._service_start_times
+
+    @property
+    def waiting_times(self) -> array:
+        self._sync_serving_fe(); self.sync_schedule(); return self._waiting_times
+
+    @property
+    def forward_time_slacks(self) -> array:
+        self._sync_serving_fe(); self.sync_schedule(); return self._forward_time_slacks
+
+    @property
+    def start_time(self) -> float:
+        self._sync_serving_fe()
+        if self.pending_start_time is not None: return self.pending_start_time
+        return self._service_start_times[0]
+
+    def _sync_serving_fe(self):
+        """ Thời điểm xuất phát do FE quyết định: FE đang dirty thì đồng bộ nó trước khi đọc lịch. """
+        for fe_route in self.serving_fe_routes: fe_route.flush()
+
+    def _mark_serving_fe_dirty(self, customer: "Customer", sign: int):
+        """ Báo cho FE đang phục vụ: khách hàng được chèn (sign = 1) / xóa (sign = -1) khỏi route. """
+        for fe_route in self.serving_fe_routes:
+            fe_route.account_customer(customer, sign)
+            fe_route.mark_dirty(self.satellite.id)
+
+    def position_of(self, node_id: int) -> Optional[int]:
+        positions = self._positions
+        if positions is None:
+            positions = self._positions = {nid: i for i, nid in enumerate(self.nodes_id)}
+        return positions.get(node_id)
+
+    def _reindex_from(self, pos: int):
+        """ Cập nhật chỉ mục vị trí cho các node từ pos về cuối (sau khi chèn / xóa tại pos). """
+        positions, nodes_id = self._positions, self.nodes_id
+        if positions is None: return
+        for i in range(pos, len(nodes_id)):
+            positions[nodes_id[i]] = i
+
+    def update_time_profile(self):
+        """ Hồ sơ thời gian (xuất phát muộn nhất, thời điểm về theo thời điểm xuất phát); tính lại khi dãy node đổi. """
+        self.time_profile = calculate_se_time_profile(self.problem, self.nodes_id)
+
     def calculate_full_schedule_and_slacks(self):
-        for i in range(len(self.nodes_id) - 1):
-            prev_id, curr_id = self.nodes_id[i], self.nodes_id[i+1]
-            prev_obj = self.problem.node_objects[prev_id % self.problem.total_nodes]
-            curr_obj = self.problem.node_objects[curr_id % self.problem.total_nodes]
-            st_prev = prev_obj.service_time if prev_obj.type != 'Satellite' else 0.0
-            departure_prev = self.service_start_times.get(prev_id, 0.0) + st_prev
-            arrival_curr = departure_prev + self.problem.get_travel_time(prev_obj.id, curr_obj.id)
-            start_service = max(arrival_curr, getattr(curr_obj, 'ready_time', 0))
-            self.service_start_times[curr_id] = start_service
-            self.waiting_times[curr_id] = start_service - arrival_curr
-        n = len(self.nodes_id)
-        if self.nodes_id: self.forward_time_slacks.setdefault(self.nodes_id[n-1], float('inf'))
-        for i in range(n - 2, -1, -1):
-            node_id, succ_id = self.nodes_id[i], self.nodes_id[i+1]
-            node_obj = self.problem.node_objects[node_id % self.problem.total_nodes]
-            due_time = getattr(node_obj, 'due_time', float('inf'))
-            st_node = node_obj.service_time if node_obj.type != 'Satellite' else 0.0
-            departure_node = self.service_start_times.get(node_id, 0.0) + st_node
-            arrival_succ = self.service_start_times.get(succ_id, 0.0) - self.waiting_times.get(succ_id, 0.0)
-            slack_between = arrival_succ - departure_node
-            self.forward_time_slacks[node_id] = min(self.forward_time_slacks.get(succ_id, float('inf')) + slack_between, due_time - self.service_start_times.get(node_id, 0.0))
+        self.update_schedule_from(1, len(self.nodes_id) - 1)
+
+    def update_schedule_from(self, pos: int, changed_until: int):
+        """
+        Cập nhật lịch tăng dần. Các node ở vị trí [pos, changed_until] có node liền trước (hoặc lịch của nó) đã đổi
+        nên luôn được tính lại; sau đó chiều xuôi dừng ở node đầu tiên có thời điểm bắt đầu phục vụ không đổi
+        (thời gian chờ đã hấp thụ độ đẩy). Chiều ngược tính lại forward slack từ điểm dừng về đầu route,
+        dừng sớm ở phía trước pos khi slack không đổi.
+        """
+        problem = self.problem
+        base_id, ready_time, due_time, service_time = problem.base_id, problem.ready_time, problem.due_time, problem.service_time
+        nodes_id, starts, waits, slacks = self.nodes_id, self._service_start_times, self._waiting_times, self._forward_time_slacks
+        n = len(nodes_id)
+        stop = n - 1
+        for i in range(max(pos, 1), n):
+            prev_base, curr_base = base_id[nodes_id[i-1]], base_id[nodes_id[i]]
+            arrival_curr = starts[i-1] + service_time[prev_base] + problem.get_travel_time(prev_base, curr_base)
+            start_service = max(arrival_curr, ready_time[curr_base])
+            unchanged = i > changed_until and starts[i] == start_service
+            starts[i] = start_service
+            waits[i] = start_service - arrival_curr
+            if unchanged:
+                stop = i
+                break
+        
+        slacks[n-1] = float('inf')
+        # Node tại stop giữ nguyên thời điểm bắt đầu và các node sau nó không đổi -> slack của nó không đổi
+        for i in range(stop - 1, -1, -1):
+            # Savelsbergh: độ trễ tại node được thời gian chờ ở node kế tiếp hấp thụ một phần
+            slack = min(slacks[i+1] + waits[i+1], due_time[base_id[nodes_id[i]]] - starts[i])
+            if i < pos and slacks[i] == slack:
+                break
+            slacks[i] = slack
+
+    def set_start_time(self, start_time: float):
+        """
+        Đổi thời điểm xuất phát tại vệ tinh, O(1): khả thi và thời điểm về đã có trong time_profile,
+        lịch chi tiết chỉ được tính lại khi có ai đọc nó (sync_schedule).
+        """
+        current = self.pending_start_time if self.pending_start_time is not None else self._service_start_times[0]
+        if start_time != current:
+            self.pending_start_time = start_time
+
+    def sync_schedule(self):
+        """ Áp thời điểm xuất phát đang chờ vào lịch; route dài tính lại cả lịch bằng phép quét vector hóa. """
+        start_time = self.pending_start_time
+        if start_time is None: return
+        self.pending_start_time = None
+        self._service_start_times[0] = start_time
+        if len(self.nodes_id) < VECTORIZE_MIN_NODES:
+            self.update_schedule_from(1, 0)
+            return
+        result = self.evaluate_start_times(start_time)
+        self._service_start_times[:] = array('d', result.start_times.tobytes())
+        self._waiting_times[:] = array('d', result.waiting_times.tobytes())
+        self._forward_time_slacks[:] = array('d', result.forward_slacks.tobytes())
+
+    def evaluate_start_times(self, start_time: float) -> SEScheduleResult:
+        """ Lịch của route khi xuất phát tại start_time, không thay đổi route. """
+        return evaluate_se_schedule(build_se_schedule_arrays(self.problem, self.nodes_id), start_time)
+
+    def update_load_profile(self):
+        """
+        Tải trên xe sau mỗi vị trí (xuất phát với toàn bộ hàng giao) và max tiền tố / hậu tố của nó.
+        Chèn hàng giao d sau vị trí i: mọi tải ở vị trí <= i tăng d -> cần prefix_max_load[i] + d <= cap.
+        Chèn hàng lấy d sau vị trí i: mọi tải từ vị trí i trở đi tăng d -> cần suffix_max_load[i] + d <= cap.
+        (Tải không bao giờ âm nên không cần min tiền tố / hậu tố.)
+        """
+        signed_demand = self.problem.signed_demand
+        load = self.total_load_delivery
+        loads = [load]
+        for node_id in self.customers.ids():
+            load += signed_demand[node_id]
+            loads.append(load)
+        loads.append(load)
+        self.prefix_max_load = array('d', itertools.accumulate(loads, max))
+        suffix_max_load = array('d', itertools.accumulate(reversed(loads), max))
+        suffix_max_load.reverse()
+        self.suffix_max_load = suffix_max_load
 
     def __repr__(self) -> str:
         path_ids = [nid % self.problem.total_nodes for nid in self.nodes_id]
         path_str = " -> ".join(map(str, path_ids))
-        start_time_val = self.service_start_times.get(self.nodes_id[0], 0.0)
-        end_time_val = self.service_start_times.get(self.nodes_id[-1], 0.0)
+        starts, waits = self.service_start_times, self.waiting_times
+        start_time_val, end_time_val = starts[0], starts[-1]
         operating_time = end_time_val - start_time_val if len(self.nodes_id) > 1 else 0.0
         header_str = (f"--- SERoute for Satellite {self.satellite.id} (Cost: {self.total_dist:.2f}, Time: {operating_time:.2f}) ---")
         lines = [header_str, f"Path: {path_str}"]
@@ -177,53 +592,73 @@ class SERoute:
         current_load = self.total_load_delivery
         dep_start = start_time_val
         lines.append(f"  {str(self.satellite.id) + ' (Dist)':<10}| {'Satellite':<18}| {-self.total_load_delivery:>8.2f}| {current_load:>12.2f}| {start_time_val:>9.2f}| {start_time_val:>9.2f}| {dep_start:>11.2f}| {'N/A':>10}")
-        for node_id in self.nodes_id[1:-1]:
-            customer = self.problem.node_objects[node_id]
+        for pos, customer in enumerate(self.customers, start=1):
             demand_str, deadline_str = "", "N/A"
             if customer.type == 'DeliveryCustomer': current_load -= customer.demand; demand_str = f"{-customer.demand:.2f}"
             else: current_load += customer.demand; demand_str = f"+{customer.demand:.2f}"; 
             if hasattr(customer, 'deadline'): deadline_str = f"{customer.deadline:.2f}"
-            arrival = self.service_start_times.get(node_id, 0.0) - self.waiting_times.get(node_id, 0.0)
-            start_svc = self.service_start_times.get(node_id, 0.0)
+            arrival = starts[pos] - waits[pos]
+            start_svc = starts[pos]
             departure = start_svc + customer.service_time
             lines.append(f"  {customer.id:<10}| {customer.type:<18}| {demand_str:>8}| {current_load:>12.2f}| {arrival:>9.2f}| {start_svc:>9.2f}| {departure:>11.2f}| {deadline_str:>10}")
         final_load = current_load
-        arrival_end = self.service_start_times.get(self.nodes_id[-1], 0.0) - self.waiting_times.get(self.nodes_id[-1], 0.0)
+        arrival_end = starts[-1] - waits[-1]
         dep_end = end_time_val
         lines.append(f"  {str(self.satellite.id) + ' (Coll)':<10}| {'Satellite':<18}| {self.total_load_pickup:>+8.2f}| {final_load:>12.2f}| {arrival_end:>9.2f}| {end_time_val:>9.2f}| {dep_end:>11.2f}| {'N/A':>10}")
         return "\n".join(lines)
     
     def insert_customer_at_pos(self, customer: "Customer", pos: int):
-        prev_obj = self.problem.node_objects[self.nodes_id[pos-1] % self.problem.total_nodes]; succ_obj = self.problem.node_objects[self.nodes_id[pos] % self.problem.total_nodes]
-        dist_change = (self.problem.get_distance(prev_obj.id, customer.id) + self.problem.get_distance(customer.id, succ_obj.id) - self.problem.get_distance(prev_obj.id, succ_obj.id))
-        time_change = (self.problem.get_travel_time(prev_obj.id, customer.id) + self.problem.get_travel_time(customer.id, succ_obj.id) - self.problem.get_travel_time(prev_obj.id, succ_obj.id))
-        self.nodes_id.insert(pos, customer.id); self.total_dist += dist_change; self.total_travel_time += time_change
-        if customer.type == 'DeliveryCustomer': self.total_load_delivery += customer.demand
+        problem = self.problem; cust_id = customer.id
+        prev_id = problem.base_id[self.nodes_id[pos-1]]; succ_id = problem.base_id[self.nodes_id[pos]]
+        dist_change = (problem.get_distance(prev_id, cust_id) + problem.get_distance(cust_id, succ_id) - problem.get_distance(prev_id, succ_id))
+        time_change = (problem.get_travel_time(prev_id, cust_id) + problem.get_travel_time(cust_id, succ_id) - problem.get_travel_time(prev_id, succ_id))
+        self.sync_schedule()
+        self.nodes_id.insert(pos, cust_id); self.total_dist += dist_change; self.total_travel_time += time_change
+        self._service_start_times.insert(pos, 0.0); self._waiting_times.insert(pos, 0.0); self._forward_time_slacks.insert(pos, 0.0)
+        self._reindex_from(pos)
+        if problem.is_delivery[cust_id]: self.total_load_delivery += customer.demand
         else: self.total_load_pickup += customer.demand
-        self.calculate_full_schedule_and_slacks()
+        self.update_load_profile()
+        self.update_time_profile()
+        self.update_schedule_from(pos, pos + 1)
+        self._mark_serving_fe_dirty(customer, 1)
         
     def remove_customer(self, customer: "Customer"):
-        if customer.id not in self.nodes_id: return
-        pos = self.nodes_id.index(customer.id)
-        prev_obj = self.problem.node_objects[self.nodes_id[pos-1] % self.problem.total_nodes]; succ_obj = self.problem.node_objects[self.nodes_id[pos+1] % self.problem.total_nodes]
-        dist_change = (self.problem.get_distance(prev_obj.id, customer.id) + self.problem.get_distance(customer.id, succ_obj.id) - self.problem.get_distance(prev_obj.id, succ_obj.id))
-        time_change = (self.problem.get_travel_time(prev_obj.id, customer.id) + self.problem.get_travel_time(customer.id, succ_obj.id) - self.problem.get_travel_time(prev_obj.id, succ_obj.id))
+        problem = self.problem; cust_id = customer.id
+        pos = self.position_of(cust_id)
+        if pos is None: return
+        prev_id = problem.base_id[self.nodes_id[pos-1]]; succ_id = problem.base_id[self.nodes_id[pos+1]]
+        dist_change = (problem.get_distance(prev_id, cust_id) + problem.get_distance(cust_id, succ_id) - problem.get_distance(prev_id, succ_id))
+        time_change = (problem.get_travel_time(prev_id, cust_id) + problem.get_travel_time(cust_id, succ_id) - problem.get_travel_time(prev_id, succ_id))
+        self.sync_schedule()
         self.total_dist -= dist_change; self.total_travel_time -= time_change; self.nodes_id.pop(pos)
-        if customer.type == 'DeliveryCustomer': self.total_load_delivery -= customer.demand
+        self._service_start_times.pop(pos); self._waiting_times.pop(pos); self._forward_time_slacks.pop(pos)
+        del self._positions[cust_id]; self._reindex_from(pos)
+        if problem.is_delivery[cust_id]: self.total_load_delivery -= customer.demand
         else: self.total_load_pickup -= customer.demand
-        self.calculate_full_schedule_and_slacks()
+        self.update_load_profile()
+        self.update_time_profile()
+        self.update_schedule_from(pos, pos)
+        self._mark_serving_fe_dirty(customer, -1)
         
-    def get_customers(self) -> List["Customer"]: return [self.problem.node_objects[nid] for nid in self.nodes_id[1:-1]]
+    def get_customers(self) -> List["Customer"]:
+        """ Cấp phát list mới; chỉ cần duyệt thì dùng view self.customers. """
+        return list(self.customers)
     def backup(self) -> RouteMemento: return RouteMemento(self)
     def restore(self, memento: RouteMemento):
         self.nodes_id = memento.nodes_id
+        self._positions = None
         self.total_dist = memento.total_dist
         self.total_travel_time = memento.total_travel_time
         self.total_load_pickup = memento.total_load_pickup
         self.total_load_delivery = memento.total_load_delivery
-        self.service_start_times = memento.service_start_times
-        self.waiting_times = memento.waiting_times
-        self.forward_time_slacks = memento.forward_time_slacks
+        self._service_start_times = memento.service_start_times
+        self._waiting_times = memento.waiting_times
+        self._forward_time_slacks = memento.forward_time_slacks
+        self.pending_start_time = memento.pending_start_time
+        self.prefix_max_load = memento.prefix_max_load
+        self.suffix_max_load = memento.suffix_max_load
+        self.time_profile = memento.time_profile
         self.serving_fe_routes = memento.serving_fe_routes
 
 class Solution:
@@ -235,15 +670,24 @@ class Solution:
         self.unserved_customers: List["Customer"] = []
 
     def add_fe_route(self, fe_route: FERoute): self.fe_routes.append(fe_route)
-    def add_se_route(self, se_route: SERoute): self.se_routes.append(se_route); self.update_customer_map()
+    def add_se_route(self, se_route: SERoute): self.se_routes.append(se_route); self.map_route_customers(se_route)
     def remove_fe_route(self, fe_route: FERoute):
         if fe_route in self.fe_routes: self.fe_routes.remove(fe_route)
     def remove_se_route(self, se_route: SERoute):
         if se_route in self.se_routes: self.se_routes.remove(se_route)
-        self.update_customer_map()
+        self.unmap_route_customers(se_route)
     def link_routes(self, fe_route: FERoute, se_route: SERoute): fe_route.add_serviced_se_route(se_route); se_route.serving_fe_routes.add(fe_route)
     def unlink_routes(self, fe_route: FERoute, se_route: SERoute): fe_route.remove_serviced_se_route(se_route); se_route.serving_fe_routes.discard(fe_route)
-    def update_customer_map(self): self.customer_to_se_route_map = {c.id: r for r in self.se_routes for c in r.get_customers()}
+    def update_customer_map(self): self.customer_to_se_route_map = {cid: r for r in self.se_routes for cid in r.customers.ids()}
+    # Cập nhật tăng dần customer_to_se_route_map (chỉ mục thành viên route) thay vì dựng lại toàn bộ
+    def map_customer(self, cust_id: int, se_route: SERoute): self.customer_to_se_route_map[cust_id] = se_route
+    def unmap_customer(self, cust_id: int): self.customer_to_se_route_map.pop(cust_id, None)
+    def map_route_customers(self, se_route: SERoute):
+        for cust_id in se_route.customers.ids(): self.customer_to_se_route_map[cust_id] = se_route
+    def unmap_route_customers(self, se_route: SERoute):
+        cust_map = self.customer_to_se_route_map
+        for cust_id in se_route.customers.ids():
+            if cust_map.get(cust_id) is se_route: del cust_map[cust_id]
     
     def get_objective_cost(self) -> float:
         primary_cost = 0.0
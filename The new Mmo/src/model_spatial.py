@@ -0,0 +1,154 @@
+# model_spatial.py
+import math
+import numpy as np
+
+
+class SpatialGrid:
+    """
+    Lưới đều (uniform grid) trên tọa độ của một tập node (khách hàng hoặc vệ tinh).
+    Id node của từng ô được lưu liền nhau kiểu CSR (cell_start/cell_items, trong mỗi ô sắp theo id),
+    nên truy vấn láng giềng chỉ duyệt các ô quanh điểm hỏi thay vì toàn bộ node.
+    """
+    def __init__(self, coords: np.ndarray, node_ids, points_per_cell: float = 4.0):
+        self.node_ids = np.asarray(node_ids, dtype=np.int32)
+        n = len(self.node_ids)
+        points = coords[self.node_ids] if n else np.zeros((0, 2))
+        self.origin = points.min(axis=0) if n else np.zeros(2)
+        extent = points.max(axis=0) - self.origin if n else np.zeros(2)
+        # Kích thước ô sao cho trung bình mỗi ô có ~points_per_cell node (kể cả khi các điểm thẳng hàng)
+        cell_size = max(math.sqrt(extent[0] * extent[1] * points_per_cell / max(n, 1)),
+                        float(extent.max()) * points_per_cell / max(n, 1))
+        self.cell_size = cell_size if cell_size > 0 and math.isfinite(cell_size) else 1.0
+        self.nx, self.ny = (np.floor(extent / self.cell_size).astype(np.int64) + 1).tolist()
+
+        cx, cy = self._cells_of(points)
+        flat = np.clip(cx, 0, self.nx - 1) * self.ny + np.clip(cy, 0, self.ny - 1)
+        order = np.lexsort((self.node_ids, flat))
+        self.cell_items = self.node_ids[order]
+        self.cell_start = np.searchsorted(flat[order], np.arange(self.nx * self.ny + 1)).tolist()
+        self.coords = coords
+
+    def __len__(self): return len(self.node_ids)
+
+    def _cells_of(self, points):
+        cells = np.floor((np.asarray(points, dtype=np.float64) - self.origin) / self.cell_size).astype(np.int64)
+        return cells[..., 0], cells[..., 1]
+
+    def _column(self, x, y0, y1):
+        """ Các id trong ô (x, y0..y1), đã cắt theo biên lưới; một cột là một đoạn liền trong cell_items. """
+        if x < 0 or x >= self.nx:
+            return None
+        y0, y1 = max(y0, 0), min(y1, self.ny - 1)
+        if y0 > y1:
+            return None
+        start, end = self.cell_start[x * self.ny + y0], self.cell_start[x * self.ny + y1 + 1]
+        return self.cell_items[start:end] if end > start else None
+
+    def ring_items(self, cx, cy, r):
+        """ Id các node trong những ô cách ô (cx, cy) đúng r ô (khoảng cách Chebyshev). """
+        if r == 0:
+            parts = [self._column(cx, cy, cy)]
+        else:
+            parts = [self._column(cx - r, cy - r, cy + r), self._column(cx + r, cy - r, cy + r)]
+            for x in range(max(cx - r + 1, 0), min(cx + r - 1, self.nx - 1) + 1):
+                parts.append(self._column(x, cy - r, cy - r))
+                parts.append(self._column(x, cy + r, cy + r))
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return self.cell_items[:0]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _covers_grid(self, cx, cy, r):
+        return cx - r <= 0 and cy - r <= 0 and cx + r >= self.nx - 1 and cy + r >= self.ny - 1
+
+    def _ring_lower_bound(self, x, y, cx, cy, r):
+        """
+        Cận dưới khoảng cách từ (x, y) tới mọi node ở vòng >= r: khoảng cách tới biên của khối ô vòng r-1.
+        Cạnh nằm ngoài biên lưới bị bỏ qua (phía ngoài không có node). Trả về inf nếu đã phủ hết lưới.
+        """
+        if r == 0:
+            return 0.0
+        inner = r - 1
+        bound = float('inf')
+        if cx - inner > 0: bound = min(bound, x - (self.origin[0] + (cx - inner) * self.cell_size))
+        if cx + inner < self.nx - 1: bound = min(bound, self.origin[0] + (cx + inner + 1) * self.cell_size - x)
+        if cy - inner > 0: bound = min(bound, y - (self.origin[1] + (cy - inner) * self.cell_size))
+        if cy + inner < self.ny - 1: bound = min(bound, self.origin[1] + (cy + inner + 1) * self.cell_size - y)
+        return max(bound, 0.0)
+
+    def iter_rings(self, x: float, y: float):
+        """
+        Sinh (cận dưới khoảng cách, mảng id) theo từng vòng ô quanh (x, y), từ trong ra ngoài.
+        Người gọi dừng vòng lặp khi kết quả hiện có đã không vượt quá cận dưới của vòng kế tiếp.
+        """
+        cx, cy = self._cells_of((x, y))
+        cx, cy = int(cx), int(cy)
+        r = 0
+        while True:
+            bound = self._ring_lower_bound(x, y, cx, cy, r)
+            if bound == float('inf'):
+                return
+            yield bound, self.ring_items(cx, cy, r)
+            if self._covers_grid(cx, cy, r):
+                return
+            r += 1
+
+    def nearest(self, x: float, y: float, k: int):
+        """ k id gần (x, y) nhất theo khoảng cách Euclid trên tọa độ, hòa thì id nhỏ trước. """
+        found_ids, found_dist = [], []
+        for bound, ids in self.iter_rings(x, y):
+            if len(found_dist) >= k and sorted(found_dist)[k - 1] <= bound:
+                break
+            if len(ids):
+                diff = self.coords[ids] - (x, y)
+                found_ids.extend(ids.tolist())
+                found_dist.extend(np.sqrt((diff * diff).sum(axis=1)).tolist())
+        order = sorted(range(len(found_ids)), key=lambda i: (found_dist[i], found_ids[i]))
+        return [found_ids[i] for i in order[:k]]
+
+    def k_nearest(self, source_ids, k: int, distances, exclude_self: bool = False) -> np.ndarray:
+        """
+        Top-k node của lưới cho từng id nguồn, theo hàm khoảng cách theo lô distances(rows, cols)
+        (ví dụ ProblemInstance.get_distances); hòa thì id nhỏ trước.
+        Các nguồn cùng ô được xử lý chung: mở rộng vòng tới bán kính R đủ k ứng viên, khi đó láng giềng
+        thứ k cách mọi điểm trong ô không quá (R+1)*sqrt(2) ô, nên chỉ cần thêm các vòng trong bán kính đó.
+        """
+        source_ids = np.asarray(source_ids, dtype=np.int32)
+        result = np.empty((len(source_ids), k), dtype=np.int32)
+        if k == 0 or len(source_ids) == 0:
+            return result
+        need = k + 1 if exclude_self else k
+        cx, cy = self._cells_of(self.coords[source_ids])
+        cell_keys = np.stack((cx, cy), axis=1)
+        unique_cells, group_of = np.unique(cell_keys, axis=0, return_inverse=True)
+        group_of = group_of.reshape(-1)
+        members = np.argsort(group_of, kind='stable')
+        bounds = np.searchsorted(group_of[members], np.arange(len(unique_cells) + 1))
+
+        for g, (gx, gy) in enumerate(unique_cells.tolist()):
+            rows_pos = members[bounds[g]:bounds[g + 1]]
+            rows = source_ids[rows_pos]
+            parts, count, r = [], 0, 0
+            while True:
+                ring = self.ring_items(gx, gy, r)
+                parts.append(ring); count += len(ring)
+                if count >= need or self._covers_grid(gx, gy, r):
+                    break
+                r += 1
+            r_max = int((r + 1) * math.sqrt(2)) + 2
+            while r < r_max and not self._covers_grid(gx, gy, r):
+                r += 1
+                parts.append(self.ring_items(gx, gy, r))
+            cand = np.sort(np.concatenate(parts))
+
+            block = np.asarray(distances(rows[:, None], cand[None, :]), dtype=np.float64)
+            if exclude_self:
+                block[rows[:, None] == cand[None, :]] = np.inf
+            if k < block.shape[1]:
+                pick = np.argpartition(block, k - 1, axis=1)[:, :k]
+            else:
+                pick = np.broadcast_to(np.arange(block.shape[1]), block.shape)
+            pick_dist = np.take_along_axis(block, pick, axis=1)
+            order = np.lexsort((pick, pick_dist), axis=1)
+            result[rows_pos] = cand[np.take_along_axis(pick, order, axis=1)]
+        return result
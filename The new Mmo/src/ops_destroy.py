@@ -3,7 +3,6 @@ import random
 from typing import List, Set
 
 import config
-from logic_core import _recalculate_fe_route_and_check_feasibility
 from model_solution import Solution, ChangeContext
 from model_problem import Customer
 
@@ -34,24 +33,21 @@ def _perform_removal(solution: Solution, context: ChangeContext, to_remove_ids:
             customer_obj = solution.problem.node_objects[cust_id]
             removed_objs.append(customer_obj)
             se_route.remove_customer(customer_obj)
-            
-    solution.update_customer_map()
+            solution.unmap_customer(cust_id)
     
     # 4. Clean up empty routes and Recalculate FE
     for fe_route in affected_fes:
         # Remove empty SE routes
         for se_route_in_fe in list(fe_route.serviced_se_routes):
-            if not se_route_in_fe.get_customers():
+            if not se_route_in_fe.customers:
                 solution.unlink_routes(fe_route, se_route_in_fe)
                 solution.remove_se_route(se_route_in_fe)
                 context.track_removed_route(se_route_in_fe)
         
-        # Remove empty FE routes or Recalculate
+        # Remove empty FE routes (các FE còn lại đã bị đánh dấu dirty, đồng bộ một lần khi được đọc)
         if not fe_route.serviced_se_routes:
              solution.remove_fe_route(fe_route)
              context.track_removed_route(fe_route)
-        else:
-             _recalculate_fe_route_and_check_feasibility(fe_route, solution.problem)
              
     return removed_objs
 
@@ -78,8 +74,8 @@ def _calculate_relatedness(cust1: Customer, cust2: Customer, solution: Solution)
     se_route2 = solution.customer_to_se_route_map.get(cust2.id)
     if not se_route1 or not se_route2: return float('inf')
     
-    start_time1 = se_route1.service_start_times.get(cust1.id, 0.0)
-    start_time2 = se_route2.service_start_times.get(cust2.id, 0.0)
+    start_time1 = se_route1.service_start_times[se_route1.position_of(cust1.id)]
+    start_time2 = se_route2.service_start_times[se_route2.position_of(cust2.id)]
     time_diff = abs(start_time1 - start_time2)
     norm_time = time_diff / problem._max_due_time if problem._max_due_time > 0 else 0
     
@@ -115,7 +111,7 @@ def shaw_removal(solution: Solution, context: ChangeContext, q: int, p: int = 6)
 def worst_slack_removal(solution: Solution, context: ChangeContext, q: int, p: int = 3) -> List[Customer]:
     candidates = []
     for cust_id, se_route in solution.customer_to_se_route_map.items():
-        candidates.append((cust_id, se_route.forward_time_slacks.get(cust_id, 0.0)))
+        candidates.append((cust_id, se_route.forward_time_slacks[se_route.position_of(cust_id)]))
         
     if not candidates: return []
     candidates.sort(key=lambda x: x[1])
@@ -135,8 +131,8 @@ def worst_cost_removal(solution: Solution, context: ChangeContext, q: int, p: in
     cost_func = problem.get_distance if config.PRIMARY_OBJECTIVE == "DISTANCE" else problem.get_travel_time
 
     for cust_id, se_route in solution.customer_to_se_route_map.items():
-        if cust_id not in se_route.nodes_id: continue
-        pos = se_route.nodes_id.index(cust_id)
+        pos = se_route.position_of(cust_id)
+        if pos is None: continue
         if pos == 0 or pos == len(se_route.nodes_id) - 1: continue
             
         prev_node_id = se_route.nodes_id[pos - 1]
@@ -166,7 +162,7 @@ def route_removal(solution: Solution, context: ChangeContext, q: int) -> List[Cu
     to_remove_ids = set()
     while len(to_remove_ids) < q and se_routes:
         route_to_remove = random.choice(se_routes)
-        to_remove_ids.update({c.id for c in route_to_remove.get_customers()})
+        to_remove_ids.update(route_to_remove.customers.ids())
         se_routes.remove(route_to_remove)
     return _perform_removal(solution, context, to_remove_ids)
 
@@ -174,17 +170,17 @@ def satellite_removal(solution: Solution, context: ChangeContext, q: int) -> Lis
     active_satellites = list({se_route.satellite for se_route in solution.se_routes})
     if not active_satellites: return []
     satellite_to_clear = random.choice(active_satellites)
-    to_remove_ids = {c.id for se in solution.se_routes if se.satellite.id == satellite_to_clear.id for c in se.get_customers()}
+    to_remove_ids = {cid for se in solution.se_routes if se.satellite.id == satellite_to_clear.id for cid in se.customers.ids()}
     return _perform_removal(solution, context, to_remove_ids)
 
 def least_utilized_route_removal(solution: Solution, context: ChangeContext, q: int) -> List[Customer]:
     if not solution.se_routes: return []
-    sorted_routes = sorted(solution.se_routes, key=lambda r: len(r.get_customers()))
+    sorted_routes = sorted(solution.se_routes, key=lambda r: len(r.customers))
     pool_size = max(1, int(len(sorted_routes) * 0.25))
     candidate_pool = sorted_routes[:pool_size]
     to_remove_ids = set()
     while len(to_remove_ids) < q and candidate_pool:
         route_to_remove = random.choice(candidate_pool)
-        to_remove_ids.update({c.id for c in route_to_remove.get_customers()})
+        to_remove_ids.update(route_to_remove.customers.ids())
         candidate_pool.remove(route_to_remove)
     return _perform_removal(solution, context, to_remove_ids)
\ No newline at end of file
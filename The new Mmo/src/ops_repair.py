@@ -7,8 +7,7 @@ from model_problem import Customer
 from logic_core import (
     InsertionProcessor, 
     find_best_global_insertion_option, 
-    find_k_best_global_insertion_options, 
-    _recalculate_fe_route_and_check_feasibility
+    find_k_best_global_insertion_options
 )
 
 def _perform_insertion(solution: Solution, context: ChangeContext, customer_to_insert: Customer, best_option: Dict):
@@ -30,9 +29,8 @@ def _perform_insertion(solution: Solution, context: ChangeContext, customer_to_i
     if option_type == 'insert_into_existing_se':
         se_route, pos = best_option['se_route'], best_option['se_pos']
         if se_route.serving_fe_routes:
-            fe_route = list(se_route.serving_fe_routes)[0]
             se_route.insert_customer_at_pos(customer_to_insert, pos)
-            _recalculate_fe_route_and_check_feasibility(fe_route, problem)
+            solution.map_customer(customer_to_insert.id, se_route)
         else:
              if customer_to_insert not in solution.unserved_customers:
                 solution.unserved_customers.append(customer_to_insert)
@@ -49,7 +47,6 @@ def _perform_insertion(solution: Solution, context: ChangeContext, customer_to_i
         context.track_new_route(new_fe)
         
         solution.link_routes(new_fe, new_se)
-        _recalculate_fe_route_and_check_feasibility(new_fe, problem)
 
     elif option_type == 'create_new_se_expand_fe':
         satellite, fe_route = best_option['new_satellite'], best_option['fe_route']
@@ -59,13 +56,10 @@ def _perform_insertion(solution: Solution, context: ChangeContext, customer_to_i
         context.track_new_route(new_se)
         
         solution.link_routes(fe_route, new_se)
-        _recalculate_fe_route_and_check_feasibility(fe_route, problem)
         
     else:
         if customer_to_insert not in solution.unserved_customers:
             solution.unserved_customers.append(customer_to_insert)
-    
-    solution.update_customer_map()
 
 
 def greedy_repair(solution: Solution, context: ChangeContext, customers_to_insert: List[Customer]):
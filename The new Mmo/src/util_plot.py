@@ -1,18 +1,12 @@
 # util_plot.py
 import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 import os
 from typing import Dict, List
+from logic_schedule import FESchedule
 from model_solution import Solution
 
-def _get_unique_nodes_from_fe_schedule(schedule: List[Dict]) -> List[int]:
-    if not schedule: return []
-    path_nodes = [schedule[0]['node_id']]
-    for event in schedule[1:]:
-        if event['node_id'] != path_nodes[-1]:
-            path_nodes.append(event['node_id'])
-    return path_nodes
+def _get_unique_nodes_from_fe_schedule(schedule: FESchedule) -> List[int]:
+    return schedule.path()
 
 def plot_solution_visualization(solution: Solution, save_dir: str):
     if not solution: return
@@ -73,12 +67,12 @@ def plot_alns_history(run_history: Dict, op_history: Dict, save_dir: str):
     # 2. Operator Weights
     if op_history and op_history['iteration']:
         fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 12), sharex=True)
-        destroy_df = pd.DataFrame(op_history['destroy_weights'])
-        for op in destroy_df.columns: ax1.plot(op_history['iteration'], destroy_df[op], label=op)
+        destroy_weights = op_history['destroy_weights']
+        for op in dict.fromkeys(k for w in destroy_weights for k in w): ax1.plot(op_history['iteration'], [w.get(op, float('nan')) for w in destroy_weights], label=op)
         ax1.legend(); ax1.set_title('Destroy Operator Weights')
         
-        repair_df = pd.DataFrame(op_history['repair_weights'])
-        for op in repair_df.columns: ax2.plot(op_history['iteration'], repair_df[op], label=op)
+        repair_weights = op_history['repair_weights']
+        for op in dict.fromkeys(k for w in repair_weights for k in w): ax2.plot(op_history['iteration'], [w.get(op, float('nan')) for w in repair_weights], label=op)
         ax2.legend(); ax2.set_title('Repair Operator Weights')
         plt.savefig(os.path.join(save_dir, "operator_weights.png"), dpi=300)
         plt.close()
\ No newline at end of file
@@ -52,7 +52,7 @@ def validate_solution_feasibility(solution: Solution):
         if current_load > problem.se_vehicle_capacity + 1e-6:
              errors.append(f"SE Route #{i}: Initial load exceeds capacity.")
              
-        for cust_id in se_route.nodes_id[1:-1]:
+        for cust_id in se_route.customers.ids():
             cust = problem.node_objects[cust_id]
             if cust.type == 'DeliveryCustomer': current_load -= cust.demand
             else: current_load += cust.demand
@@ -60,22 +60,25 @@ def validate_solution_feasibility(solution: Solution):
                 errors.append(f"SE Route #{i}: Load violation at customer {cust.id}")
                 
         # Time Window Check
-        for cust in se_route.get_customers():
-            start = se_route.service_start_times.get(cust.id)
+        for pos, cust in enumerate(se_route.customers, start=1):
+            start = se_route.service_start_times[pos]
             if start < cust.ready_time - 1e-6: errors.append(f"SE #{i}: Early service for {cust.id}")
             if start > cust.due_time + 1e-6: errors.append(f"SE #{i}: Late service for {cust.id}")
 
     # 3. Validate FE Routes
     for i, fe_route in enumerate(solution.fe_routes):
+        if not fe_route.is_feasible:
+            errors.append(f"FE Route #{i}: FE-SE synchronization infeasible.")
+            continue
         if not fe_route.schedule: continue
         # Load Check
-        for event in fe_route.schedule:
-            if event['load_after'] > problem.fe_vehicle_capacity + 1e-6:
+        for load_after in fe_route.schedule.load_after:
+            if load_after > problem.fe_vehicle_capacity + 1e-6:
                 errors.append(f"FE Route #{i}: Capacity violation.")
         
         # Deadline Check
-        arrival_at_depot = fe_route.schedule[-1]['arrival_time']
-        deadlines = {cust.deadline for se in fe_route.serviced_se_routes for cust in se.get_customers() if isinstance(cust, PickupCustomer)}
+        arrival_at_depot = fe_route.schedule.arrival_time[-1]
+        deadlines = {cust.deadline for se in fe_route.serviced_se_routes for cust in se.customers if isinstance(cust, PickupCustomer)}
         if deadlines and arrival_at_depot > min(deadlines) + 1e-6:
             errors.append(f"FE Route #{i}: Deadline violation.")
 